@@ -0,0 +1,101 @@
+"""
+    Measures how far the example models' results drift when their data is stored compactly, by running
+    each model over the same synthetic data set with and without compact=True. Run from the root of the
+    repository with:
+
+        python -m benchmarks.compact_drift --symbols 20 --bars 20000
+"""
+
+from benchmarks.run_benchmarks import MODELS
+from benchmarks.synthetic import write_dataset
+from src.run_order_history import run_order_history
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import numpy as np
+
+
+def indicator_values(model):
+    """Calculate the indicators step() reads for every symbol.
+
+    Args:
+        model: The model, with its data loaded.
+
+    Returns:
+        A dictionary keyed on (symbol, indicator) of float64 arrays.
+    """
+    values = {}
+    for symbol, value in model.symbol_data.items():
+        model.current_symbol = symbol
+        model.pre_backtest_calculations(value)
+        for name in model.indicator_names:
+            values[(symbol, name)] = np.asarray(getattr(model, name), dtype=np.float64)
+    return values
+
+
+def measure_drift(model_class, data_root, data_source):
+    """Compare a model's results on full precision and compact data.
+
+    Args:
+        model_class: The model to test.
+        data_root: The folder holding the data source.
+        data_source: The data folder to test on.
+
+    Returns:
+        A dictionary of the largest differences found.
+    """
+    runs = []
+    for compact in (False, True):
+        model = model_class(data_source, 100, data_root=data_root, compact=compact, indicator_cache=None)
+        for symbol, value in model.symbol_data.items():
+            model.backtest_symbol(symbol, value)
+            model.all_ticks.update(model.current_ticks)
+        result = run_order_history(model.orders, model.all_ticks, model.symbol_data)
+        runs.append((model, result, indicator_values(model)))
+    (full, full_result, full_indicators), (compact, compact_result, compact_indicators) = runs
+
+    indicator_drift = {}
+    for (symbol, name), values in full_indicators.items():
+        difference = np.nanmax(np.abs(values - compact_indicators[(symbol, name)]))
+        indicator_drift[name] = max(indicator_drift.get(name, 0), float(difference))
+
+    changed = [symbol for symbol in full.symbol_data
+               if [(o["type"], o["time"]) for o in full.orders[symbol]]
+               != [(o["type"], o["time"]) for o in compact.orders[symbol]]]
+
+    return {
+        "symbols": len(full.symbol_data),
+        "symbols_with_changed_orders": len(changed),
+        "indicators": indicator_drift,
+        "portfolio_value": abs(compact_result.summary["final_value"] / full_result.summary["final_value"] - 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the drift introduced by compact storage.")
+    parser.add_argument("--symbols", type=int, default=20, help="How many symbols to generate.")
+    parser.add_argument("--bars", type=int, default=20000, help="How many candles to generate per symbol.")
+    args = parser.parse_args()
+
+    data_root = tempfile.mkdtemp(prefix="stark_drift_")
+    data_source = "Synthetic"
+    write_dataset(os.path.join(data_root, data_source), args.symbols, args.bars)
+
+    for name, model_class in MODELS.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            drift = measure_drift(model_class, data_root + "/", data_source)
+        print (name)
+        print ("  symbols with changed orders: {}/{}".format(drift["symbols_with_changed_orders"], drift["symbols"]))
+        print ("  relative portfolio value difference: {:.2e}".format(drift["portfolio_value"]))
+        for indicator, difference in sorted(drift["indicators"].items()):
+            print ("  largest {} difference: {:.2e}".format(indicator, difference))
+
+    shutil.rmtree(data_root)
+
+
+if __name__ == "__main__":
+    main()
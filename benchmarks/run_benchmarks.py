@@ -0,0 +1,175 @@
+"""
+    Times each stage of a backtest over a synthetic data set, and writes the results to a JSON file so
+    they can be compared between commits. Run from the root of the repository with:
+
+        python -m benchmarks.run_benchmarks --symbols 10 --bars 20000 --output benchmark_results.json
+"""
+
+from benchmarks.synthetic import write_dataset
+from models.bband_adx.bband_adx import BBAND_ADX
+from models.ema_rsi_adx.ema_rsi_adx import RSI_ADX as EMA_RSI_ADX
+from models.rsi_adx.rsi_adx import RSI_ADX
+from src.helpers.candle_cache import CACHE_DIRECTORY
+from src.run_order_history import run_order_history
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+
+MODELS = {
+    "rsi_adx": RSI_ADX,
+    "ema_rsi_adx": EMA_RSI_ADX,
+    "bband_adx": BBAND_ADX
+}
+
+
+def timed(function, repeat):
+    """Time a function, keeping the best of several runs.
+
+    Args:
+        function: The function to time, called without arguments.
+        repeat: How many times to run it.
+
+    Returns:
+        The fastest run in seconds.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def time_simulation(model, vectorized, repeat, bar_arrays=False):
+    """Time the trading rules of a model over every symbol, with the indicators already calculated.
+
+    Args:
+        model: The model, with its data loaded.
+        vectorized: Whether to time the signals hook rather than the step() loop.
+        repeat: How many times to run each symbol.
+        bar_arrays: Whether the step() loop is passed numpy arrays rather than pandas objects.
+
+    Returns:
+        The total time in seconds across the symbols.
+    """
+    total = 0
+    for symbol, value in model.symbol_data.items():
+        model.current_symbol = symbol
+        model.pre_backtest_calculations(value)
+
+        def simulate():
+            model.orders[symbol] = []
+            model.simulate(symbol, value, vectorized, bar_arrays)
+        total += timed(simulate, repeat)
+    return total
+
+
+def run_benchmarks(data_root, data_source, repeat=3):
+    """Time loading, indicators, the step loop and the portfolio replay over a data set.
+
+    Args:
+        data_root: The folder holding the data source.
+        data_source: The data folder to test on.
+        repeat: How many times to run each stage, the fastest run is kept.
+
+    Returns:
+        A dictionary of timings in seconds, keyed on stage.
+    """
+    timings = {}
+    cache_path = os.path.join(data_root, data_source, CACHE_DIRECTORY)
+
+    timings["load_data.json"] = timed(lambda: RSI_ADX(data_source, 100, data_root=data_root, use_cache=False, lazy=False),
+                                      repeat)
+    shutil.rmtree(cache_path, ignore_errors=True)
+    timings["load_data.cache_build"] = timed(lambda: RSI_ADX(data_source, 100, data_root=data_root, lazy=False), 1)
+    timings["load_data.cache"] = timed(lambda: RSI_ADX(data_source, 100, data_root=data_root, lazy=False), repeat)
+
+    for name, model_class in MODELS.items():
+        model = model_class(data_source, 100, data_root=data_root, indicator_cache=None)
+
+        def calculate():
+            for symbol, value in model.symbol_data.items():
+                model.current_symbol = symbol
+                model.pre_backtest_calculations(value)
+        timings["{}.pre_backtest_calculations".format(name)] = timed(calculate, repeat)
+
+        timings["{}.step_loop".format(name)] = time_simulation(model, False, repeat)
+        timings["{}.step_loop.bar_arrays".format(name)] = time_simulation(model, False, repeat, True)
+        timings["{}.signals".format(name)] = time_simulation(model, True, repeat)
+
+        model.all_ticks = set()
+        for value in model.symbol_data.values():
+            model.all_ticks.update(value["time"].values)
+        timings["{}.run_order_history".format(name)] = timed(
+            lambda: run_order_history(model.orders, model.all_ticks, model.symbol_data), repeat)
+
+    return timings
+
+
+def git_commit():
+    """Get the commit being benchmarked, or None outside of a git checkout."""
+    try:
+        output = subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode().strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the stages of a backtest on synthetic data.")
+    parser.add_argument("--symbols", type=int, default=10, help="How many symbols to generate.")
+    parser.add_argument("--bars", type=int, default=10000, help="How many candles to generate per symbol.")
+    parser.add_argument("--interval", default="1h", help="The candle interval to generate.")
+    parser.add_argument("--repeat", type=int, default=3, help="How many times to run each stage.")
+    parser.add_argument("--data-root", help="Where to write the data set, a temporary folder by default.")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results.")
+    args = parser.parse_args()
+
+    data_root = args.data_root or tempfile.mkdtemp(prefix="stark_benchmark_")
+    data_source = "Synthetic"
+    write_dataset(os.path.join(data_root, data_source), args.symbols, args.bars, args.interval)
+
+    # The models print as they load data, which would drown out the results.
+    with contextlib.redirect_stdout(io.StringIO()):
+        timings = run_benchmarks(data_root + "/", data_source, args.repeat)
+
+    if args.data_root is None:
+        shutil.rmtree(data_root)
+
+    results = {
+        "created": datetime.datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "config": {
+            "symbols": args.symbols,
+            "bars": args.bars,
+            "interval": args.interval,
+            "repeat": args.repeat
+        },
+        "timings": timings
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for stage, seconds in timings.items():
+        print ("{:<40} {:>10.4f}s".format(stage, seconds))
+    print ("results written to", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from src.helpers.get_historical import interval_to_milliseconds
+
+import json
+import os
+import numpy as np
+
+
+def generate_candles(bars, interval="1h", start_time=1514764800000, start_price=0.05, seed=0):
+    """Generate a deterministic random walk of klines, in the format get_historical_klines returns.
+
+    Args:
+        bars: How many candles to generate.
+        interval: The candle interval, eg. 1h, as a binance interval string.
+        start_time: The open time of the first candle, in milliseconds.
+        start_price: The open price of the first candle.
+        seed: The random seed, the same seed always gives the same candles.
+
+    Returns:
+        A list of klines.
+    """
+    random = np.random.RandomState(seed)
+    timeframe = interval_to_milliseconds(interval)
+
+    open_times = start_time + np.arange(bars, dtype=np.int64) * timeframe
+    close = start_price * np.exp(np.cumsum(random.normal(0, 0.01, bars)))
+    open_values = np.concatenate([[start_price], close[:-1]])
+    high = np.maximum(open_values, close) * (1 + random.uniform(0, 0.005, bars))
+    low = np.minimum(open_values, close) * (1 - random.uniform(0, 0.005, bars))
+    volume = random.uniform(0, 1000, bars)
+    trades = random.randint(1, 500, bars)
+
+    klines = []
+    for i in range(bars):
+        klines.append([
+            int(open_times[i]),
+            "{:.8f}".format(open_values[i]),
+            "{:.8f}".format(high[i]),
+            "{:.8f}".format(low[i]),
+            "{:.8f}".format(close[i]),
+            "{:.8f}".format(volume[i]),
+            int(open_times[i] + timeframe - 1),
+            "{:.8f}".format(volume[i] * close[i]),
+            int(trades[i]),
+            "{:.8f}".format(volume[i] / 2),
+            "{:.8f}".format(volume[i] * close[i] / 2),
+            "0"
+        ])
+    return klines
+
+
+def write_dataset(path, symbols=10, bars=10000, interval="1h", stagger=24, seed=0):
+    """Write a directory of synthetic candle files, in the same format as get_symbol_history.
+
+    Args:
+        path: The directory to write the files into.
+        symbols: How many symbols to generate.
+        bars: How many candles to generate for each symbol.
+        interval: The candle interval, eg. 1h, as a binance interval string.
+        stagger: How many candles later each symbol starts than the one before, as listings do.
+        seed: The random seed for the first symbol, the rest use the following seeds.
+
+    Returns:
+        The list of symbols written.
+    """
+    os.makedirs(path, exist_ok=True)
+    timeframe = interval_to_milliseconds(interval)
+
+    names = ["SYM{:04d}BTC".format(i) for i in range(symbols)]
+    for i, symbol in enumerate(names):
+        klines = generate_candles(bars, interval, start_time=1514764800000 + i * stagger * timeframe,
+                                  seed=seed + i)
+        with open("{}/{}_{}.json".format(path, symbol, interval), "w") as f:
+            f.write(json.dumps(klines))
+    return names
@@ -1,5 +1,6 @@
 from finta import TA
 from src.base.alphaprototype import AlphaPrototype
+from src.helpers import streaming_indicators
 from src.run_order_history import run_order_history
 
 
@@ -14,27 +15,49 @@ class BBAND_ADX(AlphaPrototype):
     Sell signal:
         - The close price of the candle is higher than the upper bband line.
         - RSI is less than 30."""
-    
+
+    parameter_names = ("adx_threshold", "rsi_high", "rsi_low")
+    indicator_names = ("adx", "rsi", "lower_bband", "upper_bband")
+
+    adx_threshold = 25
+    rsi_high = 70
+    rsi_low = 30
+
     def print_full_results(self):
-        run_order_history(self.orders, self.all_ticks, self.symbol_data, "rsi_adx")
+        return run_order_history(self.orders, self.all_ticks, self.symbol_data, "rsi_adx", profiler=self.profiler)
 
     def print_results(self, symbol):
         print ("processed", symbol)
 
     def pre_backtest_calculations(self, value):
-        self.ema = TA.EMA(value)
-        self.adx = TA.ADX(value)
-        self.rsi = TA.RSI(value)
-        self.bbands = TA.BBANDS(value)
+        self.ema = self.indicator(TA.EMA, value)
+        self.adx = self.indicator(TA.ADX, value)
+        self.rsi = self.indicator(TA.RSI, value)
+        self.bbands = self.indicator(TA.BBANDS, value)
         self.lower_bband = self.bbands["BB_UPPER"]
         self.upper_bband = self.bbands["BB_LOWER"]
 
+    def streaming_indicators(self):
+        return {
+            "ema": streaming_indicators.EMA(),
+            "adx": streaming_indicators.ADX(),
+            "rsi": streaming_indicators.RSI(),
+            "lower_bband": streaming_indicators.BBANDS(band="BB_UPPER"),
+            "upper_bband": streaming_indicators.BBANDS(band="BB_LOWER")
+        }
+
+    def signals(self, value):
+        buy = (value["close"] < self.lower_bband) & (self.adx > self.adx_threshold) & (self.rsi > self.rsi_high)
+        sell = (value["close"] > self.upper_bband) & (self.rsi < self.rsi_low)
+        return buy.values, sell.values
+
     def step(self, symbol, data, i):
-        if data["close"][i] < self.lower_bband[i] and self.adx[i] > 25 and self.rsi[i] > 70:
+        if data["close"][i] < self.lower_bband[i] and self.adx[i] > self.adx_threshold and self.rsi[i] > self.rsi_high:
             self.buy(symbol, data["close"][i], data["time"][i])
-        if data["close"][i] > self.upper_bband[i] and self.rsi[i] < 30:
+        elif data["close"][i] > self.upper_bband[i] and self.rsi[i] < self.rsi_low:
             self.sell(symbol, data["close"][i], data["time"][i])
 
 
-strat = BBAND_ADX("Test", 100, data_root="../../Data/")
-strat.run_backtest()
+if __name__ == "__main__":
+    strat = BBAND_ADX("Test", 100, data_root="../../Data/")
+    strat.run_backtest()
@@ -1,5 +1,6 @@
 from finta import TA
 from src.base.alphaprototype import AlphaPrototype
+from src.helpers import streaming_indicators
 from src.run_order_history import run_order_history
 
 import numpy as np
@@ -18,23 +19,43 @@ class RSI_ADX(AlphaPrototype):
         - RSI[-1] is less than or equal to the upper threshold.
         - The close price is lower than the EMA."""
 
+    parameter_names = ("ema_range", "rsi_low", "rsi_high", "adx_threshold")
+    indicator_parameter_names = ("ema_range",)
+    indicator_names = ("ema", "adx", "rsi")
+
+    ema_range = 2
+    rsi_low = 30
+    rsi_high = 90
+    adx_threshold = 25
+
     def print_full_results(self):
-        run_order_history(self.orders, self.all_ticks, self.symbol_data, "ema_rsi_adx", chunks=15)
+        return run_order_history(self.orders, self.all_ticks, self.symbol_data, "ema_rsi_adx", chunks=15,
+                                 profiler=self.profiler)
 
     def print_results(self, symbol):
         print ("processed", symbol, "profit:", self.balance - self.starting_balance)
 
     def pre_backtest_calculations(self, value):
+        self.ema = self.indicator(TA.EMA, value, period=self.ema_range)
+        self.adx = self.indicator(TA.ADX, value)
+        self.rsi = self.indicator(TA.RSI, value)
 
-        self.ema_range = 2
-        self.ema = TA.EMA(value, period=self.ema_range)
-
-        self.adx = TA.ADX(value)
-        self.rsi = TA.RSI(value)
-        self.rsi_high = 90
-        self.rsi_low = 30
+    def streaming_indicators(self):
+        return {
+            "ema": streaming_indicators.EMA(period=self.ema_range),
+            "adx": streaming_indicators.ADX(),
+            "rsi": streaming_indicators.RSI()
+        }
 
-        self.adx_threshold = 25
+    def signals(self, value):
+        previous_rsi = self.rsi.shift(1)
+        buy = (self.rsi < self.rsi_low) \
+            & (previous_rsi >= self.rsi_low) \
+            & (self.adx > self.adx_threshold)
+        sell = (self.rsi > self.rsi_high) \
+            & (value["close"] < self.ema) \
+            & (previous_rsi <= self.rsi_high)
+        return buy.values, sell.values
 
     def step(self, symbol, data, i):
         if self.rsi[i] < self.rsi_low \
@@ -48,5 +69,6 @@ class RSI_ADX(AlphaPrototype):
             self.sell(symbol, data["close"][i], data["time"][i])
 
 
-strat = RSI_ADX("Test", 100, data_root="../../Data/")
-strat.run_backtest()
+if __name__ == "__main__":
+    strat = RSI_ADX("Test", 100, data_root="../../Data/")
+    strat.run_backtest()
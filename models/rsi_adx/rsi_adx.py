@@ -1,4 +1,5 @@
 from src.base.alphaprototype import AlphaPrototype
+from src.helpers import streaming_indicators
 from src.run_order_history import run_order_history
 
 from finta import TA
@@ -15,20 +16,36 @@ class RSI_ADX(AlphaPrototype):
     Sell signal:
         - RSI is higher than the upper threshold."""
 
+    parameter_names = ("rsi_low", "rsi_high", "adx_threshold")
+    indicator_names = ("adx", "rsi")
+
+    rsi_low = 20
+    rsi_high = 70
+    adx_threshold = 25
+
     def print_full_results(self):
-        run_order_history(self.orders, self.all_ticks, self.symbol_data, "rsi_adx", chunks=20)
+        return run_order_history(self.orders, self.all_ticks, self.symbol_data, "rsi_adx", chunks=20,
+                                 profiler=self.profiler)
 
     def print_results(self, symbol):
         print ("processed", symbol)
 
     def pre_backtest_calculations(self, value):
-        self.ema = TA.EMA(value)
-        self.adx = TA.ADX(value)
-        self.rsi = TA.RSI(value)
-
-        self.rsi_low = 20
-        self.rsi_high = 70
-        self.adx_threshold = 25
+        self.ema = self.indicator(TA.EMA, value)
+        self.adx = self.indicator(TA.ADX, value)
+        self.rsi = self.indicator(TA.RSI, value)
+
+    def streaming_indicators(self):
+        return {
+            "ema": streaming_indicators.EMA(),
+            "adx": streaming_indicators.ADX(),
+            "rsi": streaming_indicators.RSI()
+        }
+
+    def signals(self, value):
+        buy = (self.rsi < self.rsi_low) & (self.adx > self.adx_threshold)
+        sell = self.rsi > self.rsi_high
+        return buy.values, sell.values
 
     def step(self, symbol, data, i):
         if self.rsi[i] < self.rsi_low and self.adx[i] > self.adx_threshold:
@@ -37,5 +54,6 @@ class RSI_ADX(AlphaPrototype):
             self.sell(symbol, data["close"][i], data["time"][i])
 
 
-strat = RSI_ADX("Test", 100, data_root="../../Data/")
-strat.run_backtest()
+if __name__ == "__main__":
+    strat = RSI_ADX("Test", 100, data_root="../../Data/")
+    strat.run_backtest()
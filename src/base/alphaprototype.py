@@ -1,8 +1,21 @@
 from abc import ABC, abstractmethod
-from collections import defaultdict
-
-import json
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from src.helpers.bars import Bars
+from src.helpers.candle_cache import COLUMNS, load_candles, read_candles, select_candles, time_range
+from src.helpers.compact_storage import CandlePool, compact_frame, float32_indicator
+from src.helpers.indicator_cache import default_cache, isolated, size_of
+from src.helpers.lazy_data import LazySymbolData
+from src.helpers.profiling import null_profiler
+from src.helpers.resample import align_timeframe, file_interval, file_symbol, interval_to_milliseconds, load_resampled
+from src.helpers.walk_forward import walk_forward_windows, window_rows
+from src.distributed import run_distributed
+from src.run_order_history import PortfolioResult, run_order_history, summarise
+
+import copy
 import os
+import numpy as np
 import pandas as pd
 
 
@@ -10,7 +23,20 @@ class AlphaPrototype(ABC):
     """Abstract base class that does the heavy lifting for a strategy class.
 
     Attributes:
-        symbol_data: A dictionary of OHLCV keyed on the symbol.
+        symbol_data: A dictionary of OHLCV keyed on the symbol, which reads each symbol when it is first used.
+        symbol_files: A dictionary of the data file each symbol was loaded from.
+        symbol_intervals: A dictionary of the candle interval of each symbol's data file.
+        interval: The candle interval tested on, eg. 4h, or None for the interval of the data files.
+        timeframes: A dictionary keyed on (symbol, interval), of the candles read by timeframe().
+        indicator_cache: The IndicatorCache used by indicator(), or None to always calculate indicators.
+        current_symbol: The symbol currently being tested.
+        profiler: The Profiler timing each phase of the run, or a NullProfiler when instrumentation is off.
+        compact: Whether candles are stored with int64 times and float32 prices, and indicators as float32.
+        pool: The CandlePool every symbol's candles are stored in, or None to store each separately.
+        portfolio: The shared Portfolio orders are placed against by run_event_backtest, or None.
+        results_store: The ResultsStore run_backtest saves results to and reuses them from, or None.
+        panel: The PricePanel symbols are read from instead of their data files, or None.
+        balances: A dictionary keyed on symbol, of the final balance of each symbol after run_backtest.
         orders: A dictionary keyed by timestamp, which contains a list of orders.
         starting_balance: The starting balance for the simulation.
         balance: The balance, updated during the simulation.
@@ -18,9 +44,23 @@ class AlphaPrototype(ABC):
         holding: A flag that states whether at this timestep, we are holding tokens.
         last_price: The last price for the symbol trading with.
         current_ticks: The ticks used in the current symbol data set.
-        all_ticks: All of the ticks uesd across all subsets of the simulation."""
-
-    def __init__(self, data_source, starting_balance, data_root="Data/", whitelist=None, exclusions=None):
+        all_ticks: All of the ticks uesd across all subsets of the simulation.
+        parameter_names: The names of the model's tunable attributes, eg. indicator periods and thresholds.
+        indicator_parameter_names: The subset of parameter_names used by pre_backtest_calculations.
+        indicator_names: The indicator attributes step() reads, swapped for numpy arrays when using bar_arrays.
+        slippage: The slippage applied to each simulated order, 0.01 for 1%.
+        fees: The fees taken from each simulated order, 0.001 for 0.1%."""
+
+    parameter_names = ()
+    indicator_parameter_names = ()
+    indicator_names = ()
+    slippage = 0.01
+    fees = 0.001
+
+    def __init__(self, data_source, starting_balance, data_root="Data/", whitelist=None, exclusions=None,
+                 use_cache=True, parameters=None, indicator_cache=default_cache, profiler=None, start_time=None,
+                 end_time=None, columns=None, lazy=True, compact=False, pooled=False, results_store=None,
+                 symbol_data=None, interval=None, panel=None):
         """Instantiates a model test.
 
         Args:
@@ -29,15 +69,65 @@ class AlphaPrototype(ABC):
             data_root: Which sub-folder of data to operate on.
             whitelist: An optional list of symbols to use.
             exclusions: An optional list of symbols to ignore.
+            use_cache: Whether to load candles through the binary cache rather than parsing the JSON each run.
+            parameters: An optional dictionary of values to override the model's default parameters with.
+            indicator_cache: The IndicatorCache to memoize indicators in, shared by all models by default.
+            profiler: An optional Profiler to record the time and memory used by each phase of the run.
+            start_time: The earliest candle open time to load, in milliseconds, or None for all of the history.
+            end_time: The latest candle open time to load, in milliseconds, or None for all of the history.
+            columns: An optional list of the OHLCV columns to load, time and close are always loaded.
+            lazy: Whether to read each symbol's data the first time it is used, rather than all of it now.
+            compact: Whether to store candles with int64 times and float32 prices, and indicators as float32,
+                to roughly halve the memory used at the cost of a little precision.
+            pooled: Whether to store every symbol's candles in one allocation, sized when the model is created.
+            results_store: An optional ResultsStore to save the results of run_backtest in, and to reuse them
+                from when nothing has changed since.
+            symbol_data: An optional symbol_data from another model with the same data settings, to share
+                its candles rather than reading them again.
+            interval: An optional candle interval to test on, eg. 4h, built from the data files of the
+                largest interval that divides it when there are none of that interval.
+            panel: An optional PricePanel built from the same data, to read symbols from as views of its
+                memory-mapped files, which worker processes share rather than each reading their own copy.
         """
         self.data_source = data_source
         self.data_root = data_root
+        self.use_cache = use_cache
+        self.indicator_cache = indicator_cache
+        self.current_symbol = None
+        self.profiler = null_profiler if profiler is None else profiler
 
         self.whitelist = whitelist
         self.exclusions = () if exclusions is None else exclusions
+        self.start_time = start_time
+        self.end_time = end_time
+        self.columns = COLUMNS
+        if columns is not None:
+            unknown = set(columns) - set(COLUMNS)
+            if unknown:
+                raise ValueError("unknown columns {}".format(sorted(unknown)))
+            self.columns = tuple(c for c in COLUMNS if c in columns or c in ("time", "close"))
+
+        self.compact = compact
+        self.pool = None
+        self.portfolio = None
+        self.results_store = results_store
+        self.panel = panel
+        self.interval = interval
+        if interval is not None and interval_to_milliseconds(interval) is None:
+            raise ValueError("unknown interval {}".format(interval))
 
         self.symbol_data = {}
+        self.symbol_files = {}
+        self.symbol_intervals = {}
+        self.timeframes = {}
         self.load_data()
+        if symbol_data is not None:
+            self.symbol_data = symbol_data
+        else:
+            if pooled:
+                self.pool = self.allocate_pool()
+            if not lazy:
+                self.symbol_data.load_all()
         self.orders = defaultdict(list)
         self.starting_balance = starting_balance
         self.balance = starting_balance
@@ -46,54 +136,313 @@ class AlphaPrototype(ABC):
         self.last_price = -1
         self.current_ticks = set()
         self.all_ticks = set()
+        self.balances = OrderedDict()
+
+        if parameters is not None:
+            self.set_parameters(parameters)
+
+    def get_parameters(self):
+        """Gets the current values of the model's parameters.
+
+        Returns:
+            A dictionary of parameter values keyed on name.
+        """
+        return {name: getattr(self, name) for name in self.parameter_names}
+
+    def set_parameters(self, parameters):
+        """Overrides some of the model's parameters.
+
+        Args:
+            parameters: A dictionary of parameter values keyed on name.
+        """
+        for name, value in parameters.items():
+            if name not in self.parameter_names:
+                raise ValueError("{} is not a parameter of {}".format(name, type(self).__name__))
+            setattr(self, name, value)
+
+    def clone(self):
+        """Copies the model's settings, without any of its loaded data or results.
+
+        Returns:
+            A shallow copy of the model, ready to read and test its own data.
+        """
+        model = copy.copy(self)
+        model.symbol_data = {}
+        model.orders = defaultdict(list)
+        model.all_ticks = set()
+        model.balances = OrderedDict()
+        model.profiler = self.profiler.spawn()
+        model.pool = None
+        model.timeframes = {}
+        return model
 
     def load_data(self):
-        """Loads test data, ignoring excluded files, or importing only whitelisted data."""
+        """Finds the JSON test data, ignoring excluded files, or importing only whitelisted data.
+
+        Nothing is read until a symbol is first looked up in symbol_data.
+        """
         mypath = self.data_root + self.data_source
-        onlyfiles = [f for f in os.listdir(mypath) if os.path.isfile(os.path.join(mypath, f))]
+        onlyfiles = [f for f in os.listdir(mypath)
+                     if f.endswith(".json") and os.path.isfile(os.path.join(mypath, f))]
 
         if self.whitelist is None:
-            self.whitelist = set([f.split("_")[0] for f in onlyfiles])
+            self.whitelist = set([file_symbol(f) for f in onlyfiles])
 
         required_data = [f for f in onlyfiles
-                         if f.split("_")[0] in self.whitelist
-                         and f.split("_") not in self.exclusions]
-
-        for file in required_data:
-            symbol = file.split("_")[0]
-            file_path = "{}/{}".format(mypath, file)
-
-            with open(file_path) as f:
-                print ("loading", file_path)
-                file_contents = json.load(f)
-                time = []
-                open_values = []
-                high = []
-                low = []
-                close = []
-                volume = []
-                for row in file_contents:
-                    time.append(float(row[0]))
-                    open_values.append(float(row[1]))
-                    high.append(float(row[2]))
-                    low.append(float(row[3]))
-                    close.append(float(row[4]))
-                    volume.append(float(row[5]))
-
-            self.symbol_data[symbol] = pd.DataFrame.from_dict({
-                "time": time,
-                "open": open_values,
-                "high": high,
-                "low": low,
-                "close": close,
-                "volume": volume
-            })
+                         if file_symbol(f) in self.whitelist
+                         and file_symbol(f) not in self.exclusions]
+
+        symbol_files = defaultdict(list)
+        for file in sorted(required_data):
+            symbol_files[file_symbol(file)].append(file)
+
+        for symbol, files in symbol_files.items():
+            file = self.choose_file(symbol, files)
+            self.symbol_files[symbol] = "{}/{}".format(mypath, file)
+            self.symbol_intervals[symbol] = file_interval(file)
+        self.symbol_data = LazySymbolData(self.symbol_files, self.load_symbol)
+
+    def choose_file(self, symbol, files):
+        """Picks which of a symbol's data files to test on, when there is one for each of several intervals.
+
+        Args:
+            symbol: The symbol.
+            files: The names of the symbol's data files.
+
+        Returns:
+            The file of the model's interval, or else of the largest interval that divides it. The file of
+            the smallest interval when the model has no interval.
+        """
+        if self.interval is None and len(files) == 1:
+            return files[0]
+
+        # Files without an interval in their name, eg. ETHBTC.json, have an interval of None.
+        intervals = {}
+        for file in files:
+            interval = file_interval(file)
+            intervals[file] = interval_to_milliseconds(interval) if interval is not None else None
+
+        if self.interval is None:
+            return min(files, key=lambda file: intervals[file] or 0)
+
+        target = interval_to_milliseconds(self.interval)
+        divisors = [file for file in files if intervals[file] and target % intervals[file] == 0]
+        if not divisors:
+            raise ValueError("no data for {} with an interval that divides {}".format(symbol, self.interval))
+        return max(divisors, key=lambda file: intervals[file])
+
+    def load_symbol(self, symbol):
+        """Reads the data for a symbol into symbol_data, when it is first used.
+
+        Args:
+            symbol: The symbol.
+
+        Returns:
+            The OHLCV DataFrame for the symbol.
+        """
+        print ("loading", self.symbol_files[symbol])
+        with self.profiler.phase("load_data", symbol):
+            return self.read_symbol_data(symbol)
+
+    def read_symbol_data(self, symbol):
+        """Reads the OHLCV data for a symbol, from the model's PricePanel if it has one, or else its data file.
+
+        Args:
+            symbol: The symbol.
+
+        Returns:
+            The OHLCV DataFrame for the symbol.
+        """
+        if self.panel is not None:
+            return self.panel.frame(symbol)
+        return self.read_symbol(self.symbol_files[symbol])
+
+    def source_candles(self, file_path, interval=None):
+        """Reads every candle in a data file, resampled when it isn't of the interval being tested on.
+
+        Args:
+            file_path: The data file for the symbol.
+            interval: The interval to read the candles at, or None for the model's interval.
+
+        Returns:
+            A float64 array of shape (6, n), memory-mapped when reading through the cache.
+        """
+        interval = self.interval if interval is None else interval
+        if interval is not None and interval != file_interval(file_path):
+            return load_resampled(file_path, interval, self.use_cache)
+        if self.use_cache:
+            return load_candles(file_path)
+        return read_candles(file_path)
+
+    def select_candles(self, file_path, interval=None):
+        """Reads the candles in a data file, within the model's time window and columns.
+
+        Args:
+            file_path: The data file for the symbol.
+            interval: The interval to read the candles at, or None for the model's interval.
+
+        Returns:
+            A float64 array with a row for each of the model's columns.
+        """
+        candles = select_candles(self.source_candles(file_path, interval), self.start_time, self.end_time,
+                                 self.columns)
+        if self.use_cache:
+            return candles
+
+        # Copy the selection, so the rest of the parsed file can be freed.
+        return candles.copy()
+
+    def read_symbol(self, file_path, interval=None):
+        """Reads the OHLCV data for a single symbol, within the model's time window and columns.
+
+        Args:
+            file_path: The data file for the symbol.
+            interval: The interval to read the candles at, or None for the model's interval.
+
+        Returns:
+            A DataFrame with the selected columns of time, open, high, low, close and volume.
+        """
+        candles = self.select_candles(file_path, interval)
+        if self.pool is not None and interval is None and file_path in self.pool.offsets:
+            time, prices = self.pool.views(file_path)
+            return compact_frame(candles, self.columns, time, prices)
+        if self.compact:
+            return compact_frame(candles, self.columns)
+
+        # The candle columns are rows, so the transpose gives a DataFrame without copying.
+        return pd.DataFrame(candles.T, columns=list(self.columns), copy=False)
+
+    def allocate_pool(self):
+        """Sets aside one CandlePool big enough for every symbol's candles within the time window.
+
+        Only the time column of each file is searched to size the pool, when reading through the cache.
+
+        Returns:
+            The CandlePool.
+        """
+        sizes = OrderedDict()
+        for file_path in self.symbol_files.values():
+            candles = self.source_candles(file_path)
+            start, end = time_range(candles[0], self.start_time, self.end_time)
+            sizes[file_path] = end - start
+
+        if self.compact:
+            return CandlePool(sizes, len(self.columns) - 1)
+        return CandlePool(sizes, len(self.columns) - 1, np.float64, np.float64)
+
+    def memory_report(self):
+        """Measures the memory held by the candles read so far, and the indicators cached for them.
+
+        Returns:
+            A DataFrame indexed on symbol, with the candles, candle_bytes, indicator_bytes and total_bytes of
+            each symbol, and a total row.
+        """
+        indicator_bytes = defaultdict(int)
+        if self.indicator_cache is not None:
+            for key, size in self.indicator_cache.sizes.items():
+                indicator_bytes[key[0]] += size
+
+        loaded = getattr(self.symbol_data, "loaded", self.symbol_data)
+        report = pd.DataFrame([{
+            "symbol": symbol,
+            "candles": len(value),
+            "candle_bytes": size_of(value),
+            "indicator_bytes": indicator_bytes[symbol]
+        } for symbol, value in loaded.items()], columns=["symbol", "candles", "candle_bytes", "indicator_bytes"])
+
+        report = report.set_index("symbol")
+        report["total_bytes"] = report["candle_bytes"] + report["indicator_bytes"]
+        report.loc["total"] = report.sum()
+        return report
+
+    def timeframe(self, interval, symbol=None):
+        """Reads a symbol's candles at another interval, eg. to calculate indicators on 1d candles alongside 1h.
+
+        The candles are resampled from the symbol's data file and kept for the rest of the run.
+
+        Args:
+            interval: The interval, eg. 1d.
+            symbol: The symbol, or None for the current symbol.
+
+        Returns:
+            A DataFrame of OHLCV in the same form as symbol_data.
+        """
+        symbol = self.current_symbol if symbol is None else symbol
+        key = (symbol, interval)
+        if key not in self.timeframes:
+            with self.profiler.phase("load_data", symbol):
+                self.timeframes[key] = self.read_symbol(self.symbol_files[symbol], interval)
+        return self.timeframes[key]
+
+    def align(self, values, interval, value, symbol=None):
+        """Lines up values calculated on another interval with the candles being tested, without looking ahead.
+
+        The interval of the candles being tested has to be known, from the model or the data file's name.
+
+        Args:
+            values: The values, eg. an indicator of self.timeframe(interval), one per candle of that interval.
+            interval: The interval the values were calculated on.
+            value: The OHLCV DataFrame for the symbol being tested.
+            symbol: The symbol, or None for the current symbol.
+
+        Returns:
+            A float64 array the length of value, of the latest value whose candle had closed when each
+            candle closed, NaN before the first one closes.
+        """
+        symbol = self.current_symbol if symbol is None else symbol
+        base_interval = self.interval if self.interval is not None else self.symbol_intervals[symbol]
+        if base_interval is None:
+            raise ValueError("{} has no interval in its name, eg. {}_1h.json, so values can't be aligned with its "
+                             "candles".format(self.symbol_files[symbol], symbol))
+        return align_timeframe(values, self.timeframe(interval, symbol)["time"], interval, value["time"],
+                               base_interval)
 
     @abstractmethod
     def pre_backtest_calculations(self, value):
         """Abstract method for carrying out pre-backtest calculations."""
         return
 
+    def indicator(self, function, value, **params):
+        """Calculates an indicator for the current symbol, reusing it if it has been calculated before.
+
+        Args:
+            function: The indicator function, eg. TA.RSI.
+            value: The OHLCV DataFrame for the symbol.
+            **params: Any parameters to pass to the function, eg. period.
+
+        Returns:
+            The result of function(value, **params), stored as float32 when the model is compact.
+        """
+        function = isolated(function)
+        if self.compact:
+            function = float32_indicator(function)
+        if self.indicator_cache is None:
+            return function(value, **params)
+        return self.indicator_cache.calculate(function, value, self.current_symbol, **params)
+
+    def signals(self, value):
+        """Optional hook for producing whole-series buy and sell signals.
+
+        Models that can express their rules as column operations can override this to skip the per-bar
+        step() loop. A buy signal takes precedence over a sell signal on the same candle.
+
+        Args:
+            value: The OHLCV DataFrame for the symbol, after pre_backtest_calculations.
+
+        Returns:
+            None to fall back on step(), otherwise a tuple of boolean arrays (buy, sell) the length of value.
+        """
+        return None
+
+    def streaming_indicators(self):
+        """Optional hook for providing incremental indicators, so the model can be run on streamed candles.
+
+        Returns:
+            None if the model can't be streamed, otherwise a dictionary of indicators from
+            src.helpers.streaming_indicators, keyed on the attribute step() reads their values from.
+        """
+        return None
+
     @abstractmethod
     def step(self, symbol, data, i):
         """Example function with PEP 484 type annotations.
@@ -123,11 +472,29 @@ class AlphaPrototype(ABC):
         if self.holding:
             return False
 
-        # Apply 1% slippage.
-        purchase_price = price * 1.01
+        with self.profiler.phase("buy", symbol):
+            if self.portfolio is not None and not self.portfolio.buy(symbol, float(price), time):
+                return False
+            self.place_buy(symbol, price, time)
+
+        return True
+
+    def place_buy(self, symbol, price, time):
+        """Carries out a buy order, updating the balance and logging the order.
+
+        Args:
+            symbol: The symbol.
+            price: The price of the symbol when buying.
+            time: The time of the purchase.
+        """
+        # Keep the account in double precision, even when the prices are stored as float32.
+        price = float(price)
+
+        # Apply slippage.
+        purchase_price = price * (1 + self.slippage)
 
         # Apply fees.
-        fees = 1 - 0.001
+        fees = 1 - self.fees
         self.balance *= fees
 
         # Calculate cost.
@@ -137,8 +504,6 @@ class AlphaPrototype(ABC):
         self.last_price = purchase_price
         self.orders[symbol].append({"symbol": symbol, "type": "buy", "price": price, "time": time})
 
-        return True
-
     def sell(self, symbol, price, time):
         """Make a sell order for the simulation.
 
@@ -153,10 +518,28 @@ class AlphaPrototype(ABC):
         if not self.holding:
             return False
 
-        # Apply 1% slippage.
-        sale_price = price * 0.99
+        with self.profiler.phase("sell", symbol):
+            if self.portfolio is not None:
+                self.portfolio.sell(symbol, float(price), time)
+            self.place_sell(symbol, price, time)
+
+        return True
+
+    def place_sell(self, symbol, price, time):
+        """Carries out a sell order, updating the balance and logging the order.
+
+        Args:
+            symbol: The symbol.
+            price: The price of the symbol when selling.
+            time: The time of the sale.
+        """
+        # Keep the account in double precision, even when the prices are stored as float32.
+        price = float(price)
+
+        # Apply slippage.
+        sale_price = price * (1 - self.slippage)
 
-        fees = 1 - 0.001
+        fees = 1 - self.fees
         self.balance = self.tokens * sale_price
         self.balance *= fees
 
@@ -165,30 +548,371 @@ class AlphaPrototype(ABC):
         self.last_price = -1
         self.orders[symbol].append({"symbol": symbol, "type": "sell", "price": price, "time": time})
 
-        return True
+    def apply_signals(self, symbol, data, buy, sell):
+        """Place the orders described by whole-series signals.
 
-    def run_backtest(self):
-        """Iterates all test data, calculates and invokes results methods."""
-        for key, value in self.symbol_data.items():
-            self.balance = self.starting_balance
-            self.tokens = 0
-            self.holding = False
-            self.last_price = -1
-            self.current_ticks = set()
+        Reduces the signals to the candles where the holding state actually changes, then makes those
+        orders through buy and sell, so the results match what step() would have produced.
 
+        Args:
+            symbol: The symbol.
+            data: The OHLCV DataFrame for the symbol.
+            buy: Boolean array, True where the model wants to buy.
+            sell: Boolean array, True where the model wants to sell.
+        """
+        buy = np.asarray(buy, dtype=bool)
+        sell = np.asarray(sell, dtype=bool) & ~buy
+
+        # 1 for a buy, -1 for a sell, only keeping candles with a signal.
+        actions = buy.astype(np.int8) - sell.astype(np.int8)
+        indices = np.flatnonzero(actions)
+        actions = actions[indices]
+
+        # Repeated signals of the same type are ignored by buy/sell, so only the first of each run counts.
+        changes = np.ones(len(actions), dtype=bool)
+        changes[1:] = actions[1:] != actions[:-1]
+        indices = indices[changes]
+        actions = actions[changes]
+
+        # A sell before anything has been bought does nothing.
+        if len(actions) and (actions[0] < 0) != self.holding:
+            indices = indices[1:]
+            actions = actions[1:]
+
+        close = data["close"].values
+        time = data["time"].values
+        for i, action in zip(indices, actions):
+            if action > 0:
+                self.buy(symbol, close[i], time[i])
+            else:
+                self.sell(symbol, close[i], time[i])
+
+    def run_steps(self, symbol, value, bar_arrays=False, start=0, end=None):
+        """Calls step() on every candle of a symbol's data, or those within a range of rows.
+
+        Args:
+            symbol: The symbol.
+            value: The OHLCV DataFrame for the symbol.
+            bar_arrays: Whether to pass step() a Bars view of numpy arrays rather than the DataFrame, with
+                the attributes in indicator_names swapped for numpy arrays while it runs.
+            start: The first row to step through.
+            end: The row after the last one to step through, or None for the end of the data.
+        """
+        end = len(value["close"].values) if end is None else end
+        if not bar_arrays:
+            for i in range(start, end):
+                self.step(symbol, value, i)
+            return
+
+        indicators = {name: getattr(self, name) for name in self.indicator_names}
+        bars = Bars(value, indicators)
+        try:
+            for name, array in bars.indicators.items():
+                setattr(self, name, array)
+            for i in range(start, end):
+                self.step(symbol, bars, i)
+        finally:
+            for name, indicator in indicators.items():
+                setattr(self, name, indicator)
+
+    def backtest_symbol(self, symbol, value, vectorized=True, bar_arrays=False):
+        """Calculates indicators and runs the simulation over the data for a single symbol.
+
+        Args:
+            symbol: The symbol.
+            value: The OHLCV DataFrame for the symbol.
+            vectorized: Whether to use the signals hook when a model provides it, rather than step().
+            bar_arrays: Whether to pass step() numpy arrays rather than pandas objects.
+        """
+        self.current_symbol = symbol
+        with self.profiler.phase("pre_backtest_calculations", symbol):
             self.pre_backtest_calculations(value)
-            data_length = len(value["close"].values)
+        self.simulate(symbol, value, vectorized, bar_arrays)
+
+    def simulate(self, symbol, value, vectorized=True, bar_arrays=False):
+        """Runs the trading rules over a symbol's data from a fresh balance, with indicators already calculated.
+
+        Args:
+            symbol: The symbol.
+            value: The OHLCV DataFrame for the symbol.
+            vectorized: Whether to use the signals hook when a model provides it, rather than step().
+            bar_arrays: Whether to pass step() numpy arrays rather than pandas objects.
+        """
+        self.balance = self.starting_balance
+        self.tokens = 0
+        self.holding = False
+        self.last_price = -1
+        self.current_ticks = set(value["time"].values)
+
+        with self.profiler.profile(symbol):
+            signals = None
+            if vectorized:
+                with self.profiler.phase("signals", symbol):
+                    signals = self.signals(value)
+                    if signals is not None:
+                        self.apply_signals(symbol, value, *signals)
+
+            if signals is None:
+                with self.profiler.phase("step_loop", symbol):
+                    self.run_steps(symbol, value, bar_arrays)
+
+        # Add the value of the tokens on at the end, if there are any.
+        if self.tokens:
+            token_value = self.tokens * float(value["close"].values[-1])
+            self.balance += token_value
+
+    def simulate_window(self, symbol, value, start, end, signals=None, bar_arrays=False):
+        """Runs the trading rules over a window of a symbol's data from a fresh balance.
+
+        The indicators and signals are calculated over the whole of the data beforehand, so step() is
+        still called with the row numbers of the whole series, and only ever sees candles up to its own.
+
+        Args:
+            symbol: The symbol.
+            value: The OHLCV DataFrame for the symbol.
+            start: The first row of the window.
+            end: The row after the last one in the window.
+            signals: The (buy, sell) signals for the whole series, or None to call step().
+            bar_arrays: Whether to pass step() numpy arrays rather than pandas objects.
+        """
+        self.balance = self.starting_balance
+        self.tokens = 0
+        self.holding = False
+        self.last_price = -1
+        self.current_ticks = set(value["time"].values[start:end])
 
-            for i in range(data_length):
-                self.current_ticks.add(value["time"].values[i])
-                self.step(key, value, i)
+        if signals is not None:
+            buy, sell = signals
+            self.apply_signals(symbol, value.iloc[start:end], np.asarray(buy)[start:end], np.asarray(sell)[start:end])
+        else:
+            self.run_steps(symbol, value, bar_arrays, start, end)
 
-            # Add the value of the tokens on at the end, if there are any.
-            token_value = self.tokens * value["close"].values[-1]
+        # Sell the tokens at the close of the window, if there are any.
+        if self.tokens:
+            token_value = self.tokens * float(value["close"].values[end - 1])
             self.balance += token_value
-            self.all_ticks = self.all_ticks.union(self.current_ticks)
+
+    def run_walk_forward(self, train, test, step=None, vectorized=True, bar_arrays=False, chunks=20):
+        """Evaluates the model over rolling windows, each trading a train period and then the test period after it.
+
+        Every symbol's indicators and signals are calculated once over its whole history, and each window
+        is then simulated over a range of its rows from a fresh balance, so the cost is close to that of a
+        single backtest however many windows there are. The orders of each test window are replayed with
+        run_order_history, and when the test windows don't overlap, each one starts from the final value
+        of the one before so they form a single out-of-sample equity curve.
+
+        Args:
+            train: The length of each train window, in milliseconds or as an interval string, eg. 90d.
+            test: The length of each test window, in milliseconds or as an interval string, eg. 30d.
+            step: How far to move each window on from the last, or None to move on by the test length.
+            vectorized: Whether to use the signals hook when a model provides it, rather than step().
+            bar_arrays: Whether to pass step() numpy arrays rather than pandas objects.
+            chunks: How many pieces to split the total assets into for each test window's portfolio.
+
+        Returns:
+            A DataFrame with a row per window, of its train start, test start and test end, the summed
+            profit of every symbol over the train and test periods, and the summary of the test period's
+            portfolio. Also a PortfolioResult of the chained test windows, or None if they overlap.
+        """
+        symbols = [symbol for symbol in self.symbol_data if len(self.symbol_data[symbol])]
+        if not symbols:
+            raise ValueError("there is no data to walk forward over")
+        first_time = min(self.symbol_data[symbol]["time"].values[0] for symbol in symbols)
+        last_time = max(self.symbol_data[symbol]["time"].values[-1] for symbol in symbols)
+        windows = walk_forward_windows(first_time, last_time, train, test, step)
+
+        orders = self.orders
+        train_profits = np.zeros(len(windows))
+        test_profits = np.zeros(len(windows))
+        test_orders = [defaultdict(list) for _ in windows]
+        rows = {}
+        try:
+            for symbol in symbols:
+                value = self.symbol_data[symbol]
+                self.current_symbol = symbol
+                with self.profiler.phase("pre_backtest_calculations", symbol):
+                    self.pre_backtest_calculations(value)
+
+                signals = None
+                if vectorized:
+                    with self.profiler.phase("signals", symbol):
+                        signals = self.signals(value)
+
+                rows[symbol] = window_rows(value["time"].values, windows)
+                with self.profiler.phase("walk_forward", symbol):
+                    for window, (start, middle, end) in enumerate(rows[symbol]):
+                        self.orders = defaultdict(list)
+                        self.simulate_window(symbol, value, start, middle, signals, bar_arrays)
+                        train_profits[window] += self.balance - self.starting_balance
+
+                        self.orders = test_orders[window]
+                        self.simulate_window(symbol, value, middle, end, signals, bar_arrays)
+                        test_profits[window] += self.balance - self.starting_balance
+        finally:
+            self.orders = orders
+
+        # Replay each test window's orders, carrying the portfolio's value on when the windows follow each other.
+        chained = len(windows) < 2 or windows[1][1] >= windows[0][2]
+        balance = self.starting_balance
+        results = []
+        with self.profiler.phase("walk_forward.portfolio"):
+            for window in range(len(windows)):
+                data = {symbol: self.symbol_data[symbol].iloc[rows[symbol][window][1]:rows[symbol][window][2]]
+                        for symbol in symbols}
+                ticks = set()
+                for points in data.values():
+                    ticks.update(points["time"].values)
+                result = run_order_history(test_orders[window], ticks, data, chunks=chunks, starting_balance=balance)
+                results.append(result)
+                if chained:
+                    balance = result.summary["final_value"]
+
+        table = pd.DataFrame([OrderedDict([
+            ("train_start", train_start),
+            ("test_start", test_start),
+            ("test_end", test_end),
+            ("train_profit", train_profit),
+            ("test_profit", test_profit)
+        ] + list(result.summary.items())) for (train_start, test_start, test_end), train_profit, test_profit, result
+            in zip(windows, train_profits, test_profits, results)])
+
+        if not chained:
+            return table, None
+
+        timestamps = np.concatenate([result.timestamps for result in results] + [np.empty(0)])
+        value_points = np.concatenate([result.value_points for result in results] + [np.empty(0)])
+        trades = [trade for result in results for trade in result.trades]
+        skipped_orders = sum(result.summary["skipped_orders"] for result in results)
+        summary = summarise(value_points, self.starting_balance, trades, skipped_orders)
+        return table, PortfolioResult(timestamps, value_points, trades, summary)
+
+    def run_backtest(self, vectorized=True, workers=1, bar_arrays=False, queue=None, shard_size=1):
+        """Iterates all test data, calculates and invokes results methods.
+
+        Args:
+            vectorized: Whether to use the signals hook when a model provides it, rather than step().
+            workers: How many processes to split the symbols across, 1 runs everything in this process.
+            bar_arrays: Whether to pass step() numpy arrays rather than pandas objects, see run_steps.
+            queue: An optional JobQueue, or the path of one, to split the symbols into jobs on for the
+                workers started with src.distributed, rather than running them here.
+            shard_size: How many symbols each job on the queue tests.
+
+        Returns:
+            Whatever print_full_results returns, eg. the PortfolioResult from run_order_history.
+        """
+        # Reuse the stored results if the model, its parameters and its data haven't changed.
+        stored = None
+        results = None
+        if self.results_store is not None:
+            run_key = self.results_store.run_key(self)
+            stored = self.results_store.load(run_key)
+
+        if stored is not None:
+            stored_orders = stored.order_list()
+            self.all_ticks = set(stored.ticks.tolist())
+        elif queue is not None:
+            results = run_distributed(queue, self, None, shard_size, vectorized, bar_arrays)[0]
+        elif workers > 1:
+            results = self.run_parallel(vectorized, workers, bar_arrays)
+
+        self.balances = OrderedDict()
+        for key in self.symbol_data:
+            if stored is not None:
+                self.orders[key].extend(stored_orders.get(key, []))
+                self.balance = stored.balances[key]
+            elif results is not None:
+                orders, self.current_ticks, self.balance, profiler = results[key]
+                self.orders[key].extend(orders)
+                self.profiler.merge(profiler)
+            else:
+                self.backtest_symbol(key, self.symbol_data[key], vectorized, bar_arrays)
+
+            if stored is None:
+                self.all_ticks = self.all_ticks.union(self.current_ticks)
+            self.balances[key] = self.balance
             self.print_results(key)
-        self.print_full_results()
+
+        with self.profiler.phase("print_full_results"):
+            result = self.print_full_results()
+
+        if self.results_store is not None and stored is None:
+            self.results_store.save(run_key, self, self.balances,
+                                    result if isinstance(result, PortfolioResult) else None)
+        return result
+
+    def start_streaming(self, symbol):
+        """Prepares to feed candles for a symbol to step() one at a time, from a fresh balance.
+
+        Args:
+            symbol: The symbol that will be streamed.
+        """
+        indicators = self.streaming_indicators()
+        if indicators is None:
+            raise NotImplementedError("{} does not provide streaming_indicators".format(type(self).__name__))
+
+        self.balance = self.starting_balance
+        self.tokens = 0
+        self.holding = False
+        self.last_price = -1
+        self.current_ticks = set()
+        self.current_symbol = symbol
+
+        self.stream_indicators = indicators
+        self.stream_data = {column: [] for column in COLUMNS}
+        for name in indicators:
+            setattr(self, name, [])
+
+    def stream(self, kline):
+        """Feeds the next candle for the symbol being streamed to step().
+
+        Each indicator is updated with just the new candle, and its value appended to the attribute step()
+        reads it from, so the cost of a candle doesn't grow with the length of the history.
+
+        Args:
+            kline: A candle, in the format written by get_symbol_history.
+        """
+        bar = {column: float(kline[i]) for i, column in enumerate(COLUMNS)}
+        for column, value in bar.items():
+            self.stream_data[column].append(value)
+        self.current_ticks.add(bar["time"])
+
+        for name, indicator in self.stream_indicators.items():
+            getattr(self, name).append(indicator.update(bar))
+
+        self.step(self.current_symbol, self.stream_data, len(self.stream_data["time"]) - 1)
+
+    def run_streaming(self, symbol, klines):
+        """Streaming variant of backtest_symbol, which feeds candles to step() as they arrive.
+
+        Further candles, eg. from a live feed, can be passed to stream() afterwards. The value of any
+        tokens still held is not added to the balance, as the stream may carry on.
+
+        Args:
+            symbol: The symbol.
+            klines: An iterable of candles, in the format written by get_symbol_history.
+        """
+        self.start_streaming(symbol)
+        for kline in klines:
+            self.stream(kline)
+
+    def run_parallel(self, vectorized, workers, bar_arrays=False):
+        """Backtests every symbol in a pool of processes.
+
+        Each process is sent a copy of the model without any data, and reads only its own symbol's file.
+
+        Args:
+            vectorized: Whether to use the signals hook when a model provides it, rather than step().
+            workers: How many processes to use.
+            bar_arrays: Whether to pass step() numpy arrays rather than pandas objects.
+
+        Returns:
+            A dictionary keyed on symbol, of the orders, ticks, final balance and profiler records for that symbol.
+        """
+        template = self.clone()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {symbol: executor.submit(_backtest_worker, template, symbol, vectorized, bar_arrays)
+                       for symbol in self.symbol_data}
+            return {symbol: future.result() for symbol, future in futures.items()}
 
     @abstractmethod
     def print_results(self, symbol):
@@ -203,4 +927,22 @@ class AlphaPrototype(ABC):
     @abstractmethod
     def print_full_results(self):
         """Abstract method for outputting custom results."""
-        return
\ No newline at end of file
+        return
+
+def _backtest_worker(model, symbol, vectorized, bar_arrays):
+    """Backtests a single symbol inside a worker process.
+
+    Args:
+        model: A copy of the model, without any loaded data.
+        symbol: The symbol to test.
+        vectorized: Whether to use the signals hook when a model provides it, rather than step().
+        bar_arrays: Whether to pass step() numpy arrays rather than pandas objects.
+
+    Returns:
+        The orders, ticks, final balance and profiler records for the symbol.
+    """
+    with model.profiler.phase("load_data", symbol):
+        value = model.read_symbol_data(symbol)
+    model.backtest_symbol(symbol, value, vectorized, bar_arrays)
+    model.profiler.close()
+    return model.orders[symbol], model.current_ticks, model.balance, model.profiler
@@ -0,0 +1,184 @@
+"""
+    Spreads backtests across any number of worker processes, on one or more hosts, through a JobQueue in a
+    SQLite file. Start workers from the root of the repository, pointed at the same queue and data, with:
+
+        python -m src.distributed worker jobs.sqlite
+
+    then pass the queue to run_backtest, or submit jobs with run_distributed.
+"""
+
+from collections import OrderedDict
+from src.helpers.job_queue import JobQueue
+
+import argparse
+import os
+import socket
+import threading
+import time
+import traceback
+
+
+def backtest_shard(model, symbols, vectorized=True, bar_arrays=False):
+    """Backtests a shard of a model's symbols, reading each symbol's data from the shared data directory.
+
+    Args:
+        model: A copy of the model, without any loaded data.
+        symbols: The symbols to test.
+        vectorized: Whether to use the signals hook when a model provides it, rather than step().
+        bar_arrays: Whether to pass step() numpy arrays rather than pandas objects.
+
+    Returns:
+        An ordered dictionary keyed on symbol, of the orders, ticks, final balance and profiler records for
+        that symbol, in the same form as run_parallel.
+    """
+    results = OrderedDict()
+    for symbol in symbols:
+        model.profiler = model.profiler.spawn()
+        with model.profiler.phase("load_data", symbol):
+            value = model.read_symbol_data(symbol)
+        model.backtest_symbol(symbol, value, vectorized, bar_arrays)
+        model.profiler.close()
+        results[symbol] = model.orders[symbol], model.current_ticks, model.balance, model.profiler
+    return results
+
+
+def submit_backtests(queue, model, combinations=None, shard_size=1, vectorized=True, bar_arrays=False,
+                     max_attempts=3):
+    """Splits the backtests of a model into (model, parameters, symbol shard) jobs on a queue.
+
+    Args:
+        queue: The JobQueue.
+        model: The model, which must be importable by the workers rather than defined in __main__.
+        combinations: An optional list of parameter dictionaries to test, or None for the model's parameters.
+        shard_size: How many symbols each job tests.
+        vectorized: Whether to use the signals hook when a model provides it, rather than step().
+        bar_arrays: Whether to pass step() numpy arrays rather than pandas objects.
+        max_attempts: How many times each job can be tried before the batch fails.
+
+    Returns:
+        The id of the batch.
+    """
+    if type(model).__module__ == "__main__":
+        raise ValueError("{} is defined in __main__, import it from its module so workers can load it"
+                         .format(type(model).__name__))
+
+    combinations = [{}] if combinations is None else combinations
+    symbols = list(model.symbol_files)
+    jobs = []
+    for combination in combinations:
+        template = model.clone()
+        template.set_parameters(combination)
+        for start in range(0, len(symbols), shard_size):
+            jobs.append((backtest_shard, (template, symbols[start:start + shard_size], vectorized, bar_arrays)))
+    return queue.submit(jobs, max_attempts)
+
+
+def run_distributed(queue, model, combinations=None, shard_size=1, vectorized=True, bar_arrays=False,
+                    poll=1.0, timeout=None):
+    """Backtests a model through a job queue, and waits for the workers to finish.
+
+    Args:
+        queue: The JobQueue, or the path of its SQLite file.
+        model: The model, which must be importable by the workers rather than defined in __main__.
+        combinations: An optional list of parameter dictionaries to test, or None for the model's parameters.
+        shard_size: How many symbols each job tests.
+        vectorized: Whether to use the signals hook when a model provides it, rather than step().
+        bar_arrays: Whether to pass step() numpy arrays rather than pandas objects.
+        poll: How many seconds to wait between checks on the jobs.
+        timeout: The most seconds to wait, or None to wait for as long as it takes.
+
+    Returns:
+        A list with an entry per combination, of a dictionary keyed on symbol of the orders, ticks, final
+        balance and profiler records for that symbol.
+    """
+    if not isinstance(queue, JobQueue):
+        queue = JobQueue(queue)
+
+    combinations = [{}] if combinations is None else combinations
+    batch = submit_backtests(queue, model, combinations, shard_size, vectorized, bar_arrays)
+    try:
+        shards = queue.wait(batch, poll, timeout)
+    finally:
+        queue.delete(batch)
+
+    # Every combination was split into the same number of shards, in order.
+    per_combination = len(shards) // len(combinations) if combinations else 0
+    results = []
+    for index in range(len(combinations)):
+        merged = {}
+        for shard in shards[index * per_combination:(index + 1) * per_combination]:
+            merged.update(shard)
+        results.append(merged)
+    return results
+
+
+def run_worker(queue, worker=None, poll=1.0, exit_when_idle=False):
+    """Claims and runs jobs from a queue until it is stopped, sending heartbeats while each job runs.
+
+    Args:
+        queue: The JobQueue, or the path of its SQLite file.
+        worker: The name of the worker, by default its host and process id.
+        poll: How many seconds to wait before checking an empty queue again.
+        exit_when_idle: Whether to return once there are no jobs, rather than waiting for more.
+
+    Returns:
+        How many jobs were run.
+    """
+    if not isinstance(queue, JobQueue):
+        queue = JobQueue(queue)
+    if worker is None:
+        worker = "{}:{}".format(socket.gethostname(), os.getpid())
+
+    jobs = 0
+    while True:
+        job = queue.claim(worker)
+        if job is None:
+            if exit_when_idle:
+                return jobs
+            time.sleep(poll)
+            continue
+
+        job_id, (function, args) = job
+        finished = threading.Event()
+
+        def beat():
+            while not finished.wait(queue.lease / 3):
+                queue.heartbeat(job_id, worker)
+
+        heartbeat = threading.Thread(target=beat, daemon=True)
+        heartbeat.start()
+        try:
+            result = function(*args)
+        except Exception:
+            queue.fail(job_id, worker, traceback.format_exc())
+        else:
+            queue.complete(job_id, worker, result)
+        finally:
+            finished.set()
+            heartbeat.join()
+        jobs += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run backtest jobs from a queue.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    worker_parser = subparsers.add_parser("worker", help="Claim and run jobs from the queue.")
+    worker_parser.add_argument("queue", help="The SQLite file holding the queue.")
+    worker_parser.add_argument("--name", help="The name of the worker, by default its host and process id.")
+    worker_parser.add_argument("--lease", type=float, default=60,
+                               help="How many seconds a job can go without a heartbeat before it is retried.")
+    worker_parser.add_argument("--poll", type=float, default=1.0, help="How often to check an empty queue.")
+    worker_parser.add_argument("--exit-when-idle", action="store_true", help="Stop once the queue is empty.")
+    args = parser.parse_args()
+
+    if args.command != "worker":
+        parser.print_help()
+        return
+
+    jobs = run_worker(JobQueue(args.queue, args.lease), args.name, args.poll, args.exit_when_idle)
+    print ("ran {} jobs".format(jobs))
+
+
+if __name__ == "__main__":
+    main()
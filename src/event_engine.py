@@ -0,0 +1,207 @@
+from src.helpers.bars import Bars
+from src.run_order_history import PortfolioResult, summarise
+
+import heapq
+import numpy as np
+
+
+class Portfolio(object):
+    """A shared account split into chunks, which holds at most one position per symbol.
+
+    Orders are costed in the same way as run_order_history.
+
+    Attributes:
+        balance: The cash balance of the account.
+        chunks: How many pieces the account is split into, ie. the most positions held at once.
+        positions: A dictionary keyed on symbol, of the tokens held and the price they were bought at.
+        prices: A dictionary keyed on symbol, of the last close price seen for each held symbol.
+        trades: The orders that were carried out, with the tokens and amount of the balance involved.
+        skipped_orders: How many orders could not be carried out.
+    """
+
+    def __init__(self, starting_balance=1000, chunks=20, slippage=0.001, fees=0.00075):
+        """Creates an account holding only cash.
+
+        Args:
+            starting_balance: The starting balance of the account.
+            chunks: How many pieces to split the account into.
+            slippage: How much slippage to apply to orders, 0.001 for 1%.
+            fees: How much to remove for fees, 0.001% for 1%.
+        """
+        self.starting_balance = starting_balance
+        self.balance = starting_balance
+        self.chunks = chunks
+        self.fees = 1 - fees
+        self.slippage_down = 1 - slippage
+        self.slippage_up = 1 + slippage
+
+        self.positions = {}
+        self.prices = {}
+        self.trades = []
+        self.skipped_orders = 0
+
+    def buy(self, symbol, price, time):
+        """Buys a symbol with the next chunk of the balance.
+
+        Args:
+            symbol: The symbol.
+            price: The price of the symbol.
+            time: The time of the order.
+
+        Returns:
+            Whether the order was carried out, False if the symbol is held or every chunk is in use.
+        """
+        if symbol in self.positions or len(self.positions) >= self.chunks:
+            self.skipped_orders += 1
+            return False
+
+        # How much can we allocate, account for fees and slippage?
+        chunk_size = self.balance / (self.chunks - len(self.positions))
+        self.balance -= chunk_size
+        tokens = (chunk_size * self.fees) / (price * self.slippage_up)
+        self.positions[symbol] = (tokens, price)
+        self.prices[symbol] = price
+        self.trades.append({"symbol": symbol, "type": "buy", "price": price, "time": time, "tokens": tokens,
+                            "amount": -chunk_size})
+        return True
+
+    def sell(self, symbol, price, time):
+        """Sells the whole position in a symbol.
+
+        Args:
+            symbol: The symbol.
+            price: The price of the symbol.
+            time: The time of the order.
+
+        Returns:
+            Whether the order was carried out, False if the symbol isn't held.
+        """
+        if symbol not in self.positions:
+            self.skipped_orders += 1
+            return False
+
+        # Make the sale and account for fees and slippage.
+        tokens, _ = self.positions.pop(symbol)
+        del self.prices[symbol]
+        return_chunk = (tokens * (price * self.slippage_down) * self.fees)
+        self.balance += return_chunk
+        self.trades.append({"symbol": symbol, "type": "sell", "price": price, "time": time, "tokens": tokens,
+                            "amount": return_chunk})
+        return True
+
+    def value(self):
+        """Get the cash balance plus the held tokens at the last prices seen."""
+        return self.balance + sum(tokens * self.prices[symbol] for symbol, (tokens, _) in self.positions.items())
+
+
+def run_event_backtest(model, chunks=20, starting_balance=1000, slippage=0.001, fees=0.00075, vectorized=True,
+                       bar_arrays=False):
+    """Backtest every symbol in a single pass, in time order, against one shared Portfolio.
+
+    The candles of every symbol are merged by time with a heap holding one cursor per symbol, and each
+    candle is passed to step() with the model's holding state taken from the shared account. A buy is only
+    made when there is a free chunk, so unlike run_backtest followed by run_order_history, a model can act
+    on the state of the real portfolio. Besides the candles and indicators, only a constant amount of
+    state is kept per symbol, and one value per tick.
+
+    Args:
+        model: The model, with its data loaded.
+        chunks: How many pieces to split the total assets into.
+        starting_balance: The starting balance of the shared account.
+        slippage: How much slippage to apply to orders, 0.001 for 1%.
+        fees: How much to remove for fees, 0.001% for 1%.
+        vectorized: Whether to use the signals hook when a model provides it, rather than step().
+        bar_arrays: Whether to pass step() numpy arrays rather than pandas objects, see run_steps.
+
+    Returns:
+        A PortfolioResult holding the value of the account at each tick, the trades and a summary.
+    """
+    portfolio = Portfolio(starting_balance, chunks, slippage, fees)
+    symbols = list(model.symbol_data)
+
+    # Calculate every symbol's indicators up front, and keep the attributes each calculation sets.
+    states = []
+    data = []
+    signals = []
+    for symbol in symbols:
+        value = model.symbol_data[symbol]
+        model.current_symbol = symbol
+        before = dict(vars(model))
+        with model.profiler.phase("pre_backtest_calculations", symbol):
+            model.pre_backtest_calculations(value)
+        states.append({name: attribute for name, attribute in vars(model).items()
+                       if name not in before or before[name] is not attribute})
+
+        symbol_signals = model.signals(value) if vectorized else None
+        if symbol_signals is not None:
+            buy, sell = (np.asarray(signal, dtype=bool) for signal in symbol_signals)
+            symbol_signals = (buy, sell & ~buy)
+        signals.append(symbol_signals)
+
+        if bar_arrays:
+            value = Bars(value, {name: getattr(model, name) for name in model.indicator_names})
+            states[-1].update(value.indicators)
+        data.append(value)
+
+    closes = [np.asarray(value["close"], dtype=np.float64) for value in data]
+    times = [np.asarray(value["time"]) for value in data]
+
+    # One cursor per symbol, ordered by the time of its next candle, then by symbol.
+    heap = [(times[index][0], index, 0) for index in range(len(symbols)) if len(times[index])]
+    heapq.heapify(heap)
+
+    timestamps = []
+    value_points = []
+    model.portfolio = portfolio
+    try:
+        with model.profiler.phase("event_loop"):
+            while heap:
+                time, index, i = heapq.heappop(heap)
+                symbol = symbols[index]
+                close = closes[index][i]
+                if symbol in portfolio.prices:
+                    portfolio.prices[symbol] = close
+
+                run_step(model, portfolio, symbol, states[index], data[index], signals[index], i)
+
+                if i + 1 < len(times[index]):
+                    heapq.heappush(heap, (times[index][i + 1], index, i + 1))
+
+                # Value the account once every candle at this time has been seen.
+                if not heap or heap[0][0] != time:
+                    timestamps.append(time)
+                    value_points.append(portfolio.value())
+    finally:
+        model.portfolio = None
+
+    value_points = np.array(value_points, dtype=np.float64)
+    summary = summarise(value_points, starting_balance, portfolio.trades, portfolio.skipped_orders)
+    return PortfolioResult(np.array(timestamps, dtype=np.float64), value_points, portfolio.trades, summary)
+
+
+def run_step(model, portfolio, symbol, state, data, signals, i):
+    """Runs the model's trading rules on one candle of a symbol, as seen by the shared account.
+
+    Args:
+        model: The model.
+        portfolio: The shared Portfolio.
+        symbol: The symbol.
+        state: The attributes pre_backtest_calculations set for the symbol, eg. its indicators.
+        data: The OHLCV data for the symbol.
+        signals: The symbol's (buy, sell) signals, or None to call step().
+        i: The index of the candle.
+    """
+    position = portfolio.positions.get(symbol)
+    model.__dict__.update(state)
+    model.current_symbol = symbol
+    model.holding = position is not None
+    model.tokens = position[0] if position is not None else 0
+    model.last_price = position[1] if position is not None else -1
+    model.balance = portfolio.balance
+
+    if signals is None:
+        model.step(symbol, data, i)
+    elif signals[0][i]:
+        model.buy(symbol, data["close"][i], data["time"][i])
+    elif signals[1][i]:
+        model.sell(symbol, data["close"][i], data["time"][i])
@@ -0,0 +1,58 @@
+from src.helpers.candle_cache import COLUMNS
+
+import numpy as np
+
+
+def as_array(series):
+    """Get the values of an indicator as a contiguous float array.
+
+    Args:
+        series: A pandas Series, or anything else numpy can convert.
+
+    Returns:
+        A 1 dimensional numpy array, which shares memory with the series where it can.
+    """
+    return np.ascontiguousarray(getattr(series, "values", series), dtype=np.float64)
+
+
+class Bars(object):
+    """A lightweight view of a symbol's candles for step(), holding each column as a numpy array.
+
+    Indexing a numpy array is many times cheaper than indexing a pandas Series, and supports the same
+    data["close"][i] lookups, so step() implementations work unchanged on either.
+
+    Attributes:
+        time: The open times of the candles.
+        open: The open prices.
+        high: The high prices.
+        low: The low prices.
+        close: The close prices.
+        volume: The volumes.
+        indicators: A dictionary of indicator arrays keyed on name, also available through data[name].
+
+    Columns that weren't loaded are None.
+    """
+
+    __slots__ = COLUMNS + ("indicators",)
+
+    def __init__(self, value, indicators=None):
+        """Builds the view over a symbol's data.
+
+        Args:
+            value: The OHLCV DataFrame for the symbol.
+            indicators: An optional dictionary of indicators to include, keyed on name.
+        """
+        for column in COLUMNS:
+            setattr(self, column, as_array(value[column]) if column in value else None)
+        self.indicators = {} if indicators is None else \
+            {name: as_array(indicator) for name, indicator in indicators.items()}
+
+    def __getitem__(self, name):
+        if name in self.indicators:
+            return self.indicators[name]
+        if name not in COLUMNS or getattr(self, name) is None:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __len__(self):
+        return len(self.time)
@@ -0,0 +1,119 @@
+import json
+import os
+import numpy as np
+
+
+COLUMNS = ("time", "open", "high", "low", "close", "volume")
+CACHE_DIRECTORY = ".cache"
+
+
+def cache_path(file_path):
+    """Get the location of the binary cache for a candle file.
+
+    The cache is kept in a hidden sub-folder next to the source file, so it is never picked up as data.
+
+    Args:
+        file_path: The path of the JSON candle file.
+
+    Returns:
+        The path of the .npy cache file.
+    """
+    directory, file_name = os.path.split(file_path)
+    return os.path.join(directory, CACHE_DIRECTORY, os.path.splitext(file_name)[0] + ".npy")
+
+
+def read_candles(file_path):
+    """Parse a JSON candle file, as written by get_symbol_history, into columns.
+
+    Args:
+        file_path: The path of the JSON candle file.
+
+    Returns:
+        A float64 array of shape (6, n), one contiguous row per column in COLUMNS.
+    """
+    with open(file_path) as f:
+        file_contents = json.load(f)
+
+    if not file_contents:
+        return np.empty((len(COLUMNS), 0))
+
+    # Each kline starts with open time, open, high, low, close and volume, the prices as strings.
+    rows = np.array([row[:len(COLUMNS)] for row in file_contents], dtype=np.float64)
+    return np.ascontiguousarray(rows.T)
+
+
+def build_cache(file_path):
+    """Write the binary cache for a candle file.
+
+    Args:
+        file_path: The path of the JSON candle file.
+
+    Returns:
+        The path of the .npy cache file.
+    """
+    path = cache_path(file_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write to a temporary file of our own first, so an interrupted build never leaves a partial cache behind
+    # and processes building the same cache at once don't write over each other.
+    temp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(temp_path, "wb") as f:
+        np.save(f, read_candles(file_path))
+    os.replace(temp_path, path)
+
+    return path
+
+
+def load_candles(file_path):
+    """Load the columns of a candle file through the binary cache.
+
+    The cache is built the first time a file is loaded, and rebuilt whenever the JSON is newer than it.
+
+    Args:
+        file_path: The path of the JSON candle file.
+
+    Returns:
+        A read-only memory-mapped float64 array of shape (6, n), one row per column in COLUMNS.
+    """
+    path = cache_path(file_path)
+    if not os.path.exists(path) or os.stat(path).st_mtime_ns < os.stat(file_path).st_mtime_ns:
+        build_cache(file_path)
+
+    return np.load(path, mmap_mode="r")
+
+
+def time_range(times, start_time=None, end_time=None):
+    """Find the rows of a sorted time column that fall within a window, with a binary search.
+
+    Args:
+        times: The sorted open times of the candles, in milliseconds.
+        start_time: The earliest open time to include, or None to start from the first candle.
+        end_time: The latest open time to include, or None to carry on to the last candle.
+
+    Returns:
+        The first row in the window, and the row after the last one.
+    """
+    start = 0 if start_time is None else int(np.searchsorted(times, start_time, side="left"))
+    end = len(times) if end_time is None else int(np.searchsorted(times, end_time, side="right"))
+    return start, max(start, end)
+
+
+def select_candles(candles, start_time=None, end_time=None, columns=COLUMNS):
+    """Select the candles within a time window, and some of their columns.
+
+    Only the time column is searched, so when the candles are memory-mapped just the selected rows of the
+    selected columns are ever read from disk.
+
+    Args:
+        candles: An array of shape (6, n), one row per column in COLUMNS, sorted by time.
+        start_time: The earliest open time to include, or None to start from the first candle.
+        end_time: The latest open time to include, or None to carry on to the last candle.
+        columns: The columns to select, in the order of COLUMNS.
+
+    Returns:
+        An array of shape (len(columns), m), a view of candles when every column is selected.
+    """
+    start, end = time_range(candles[0], start_time, end_time)
+    if tuple(columns) == COLUMNS:
+        return candles[:, start:end]
+    return candles[[COLUMNS.index(column) for column in columns], start:end]
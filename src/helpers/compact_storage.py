@@ -0,0 +1,116 @@
+from collections import OrderedDict
+
+import functools
+import numpy as np
+import pandas as pd
+
+
+TIME_DTYPE = np.int64
+PRICE_DTYPE = np.float32
+
+
+class CandlePool(object):
+    """A single allocation holding the candles of every symbol end to end, handed out as views.
+
+    The arrays are created empty, so the memory for a symbol is only touched once its candles are read.
+
+    Attributes:
+        time: The open times of every symbol's candles.
+        prices: The remaining columns of every symbol's candles, one row per column.
+        offsets: A dictionary keyed on data file, of the first and last + 1 position of its candles.
+    """
+
+    def __init__(self, sizes, price_columns, time_dtype=TIME_DTYPE, price_dtype=PRICE_DTYPE):
+        """Allocates the pool.
+
+        Args:
+            sizes: An ordered dictionary keyed on data file, of how many candles it holds.
+            price_columns: How many columns there are besides time.
+            time_dtype: The type to store the open times as.
+            price_dtype: The type to store the other columns as.
+        """
+        total = sum(sizes.values())
+        self.time = np.empty(total, dtype=time_dtype)
+        self.prices = np.empty((price_columns, total), dtype=price_dtype)
+
+        self.offsets = {}
+        start = 0
+        for key, size in sizes.items():
+            self.offsets[key] = (start, start + size)
+            start += size
+
+    @property
+    def nbytes(self):
+        return self.time.nbytes + self.prices.nbytes
+
+    def views(self, key):
+        """Gets the part of the pool set aside for a data file.
+
+        Args:
+            key: The data file.
+
+        Returns:
+            Views of the time array and the price rows.
+        """
+        start, end = self.offsets[key]
+        return self.time[start:end], self.prices[:, start:end]
+
+
+def compact_frame(candles, columns, time=None, prices=None, time_dtype=TIME_DTYPE, price_dtype=PRICE_DTYPE):
+    """Converts selected candles into a DataFrame of smaller types.
+
+    Args:
+        candles: A float64 array with one row per column, time first.
+        columns: The names of the rows of candles.
+        time: An optional array to store the times in, eg. from a CandlePool.
+        prices: An optional array to store the other columns in, eg. from a CandlePool.
+        time_dtype: The type to store the open times as, when time isn't given.
+        price_dtype: The type to store the other columns as, when prices isn't given.
+
+    Returns:
+        A DataFrame whose columns are views of time and prices.
+    """
+    if time is None:
+        time = np.empty(candles.shape[1], dtype=time_dtype)
+    if prices is None:
+        prices = np.empty((candles.shape[0] - 1, candles.shape[1]), dtype=price_dtype)
+    time[:] = candles[0]
+    prices[:] = candles[1:]
+
+    data = OrderedDict([(columns[0], time)] + [(column, prices[i]) for i, column in enumerate(columns[1:])])
+    return pd.DataFrame(data, columns=list(columns), copy=False)
+
+
+def to_float32(result):
+    """Stores the float64 parts of an indicator as float32.
+
+    Args:
+        result: A Series, DataFrame or other object.
+
+    Returns:
+        The converted result, or the result unchanged if it holds no float64 data.
+    """
+    if isinstance(result, pd.Series):
+        return result.astype(np.float32) if result.dtype == np.float64 else result
+    if isinstance(result, pd.DataFrame):
+        return result.astype({column: np.float32 for column, dtype in result.dtypes.items() if dtype == np.float64})
+    return result
+
+
+def float32_indicator(function):
+    """Wraps an indicator function so that its result is stored as float32.
+
+    The wrapper's name has a .float32 suffix, so an IndicatorCache keeps its results apart from those of the
+    full precision function.
+
+    Args:
+        function: The indicator function, eg. TA.RSI.
+
+    Returns:
+        The wrapped function.
+    """
+    @functools.wraps(function)
+    def calculate(value, **params):
+        return to_float32(function(value, **params))
+    calculate.__qualname__ = "{}.float32".format(getattr(function, "__qualname__", function.__name__))
+    return calculate
@@ -0,0 +1,163 @@
+from binance.client import Client
+from binance.exceptions import BinanceAPIException
+from requests.adapters import HTTPAdapter
+from src.helpers.get_historical import date_to_milliseconds, interval_to_milliseconds
+
+import threading
+import time
+
+
+def kline_weight(limit):
+    """Get the request weight the exchange charges for a klines request.
+
+    Args:
+        limit: The number of klines requested.
+
+    Returns:
+        The weight of the request.
+    """
+    if limit <= 100:
+        return 1
+    if limit <= 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+class RateLimiter(object):
+    """A thread-safe token bucket, shared by every request so together they stay within the weight budget.
+
+    Attributes:
+        rate: How much weight is added to the bucket each second.
+        capacity: The most weight the bucket holds, ie. the largest burst allowed.
+    """
+
+    def __init__(self, weight_per_minute=1200, burst=20):
+        """Creates a full bucket.
+
+        Args:
+            weight_per_minute: The request weight allowed by the exchange each minute.
+            burst: How much weight can be used at once after the bucket has filled up.
+        """
+        # Leave room for a full burst inside any minute, so the budget holds over a sliding window.
+        self.rate = (weight_per_minute - burst) / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, weight=1):
+        """Blocks until there is enough weight left in the bucket for a request, then takes it.
+
+        Args:
+            weight: The weight of the request.
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                wait = (weight - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Empties the bucket and holds off all requests, eg. when the exchange asks us to back off.
+
+        Args:
+            seconds: How long to wait before the next request.
+        """
+        with self.lock:
+            self.tokens = -seconds * self.rate
+            self.updated = time.monotonic()
+
+
+def create_client(api_url=None, pool_size=10):
+    """Create a binance client whose connections can be reused by several threads at once.
+
+    Args:
+        api_url: An optional base url to use instead of the exchange's, eg. a local mock endpoint.
+        pool_size: How many connections to keep open.
+
+    Returns:
+        The client.
+    """
+    client_class = Client
+    if api_url is not None:
+        # The client pings the API on creation, so the url has to be set before that.
+        client_class = type("LocalClient", (Client,), {"API_URL": api_url})
+
+    client = client_class("", "")
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    client.session.mount("https://", adapter)
+    client.session.mount("http://", adapter)
+    return client
+
+
+def get_klines(client, limiter, **params):
+    """Fetch one page of klines through the rate limiter, backing off if the exchange asks us to.
+
+    Args:
+        client: The binance client.
+        limiter: The RateLimiter shared by all requests.
+        **params: The parameters for client.get_klines.
+
+    Returns:
+        The klines.
+    """
+    while True:
+        limiter.acquire(kline_weight(params["limit"]))
+        try:
+            return client.get_klines(**params)
+        except BinanceAPIException as e:
+            if e.status_code not in (418, 429):
+                raise
+            limiter.pause(int(e.response.headers.get("Retry-After", 1)))
+
+
+def get_historical_klines_concurrent(symbol, interval, start_str, end_str, client, limiter, executor,
+                                     limit=500):
+    """Get historical klines, fetching windows of the time range concurrently.
+
+    Takes the same start and end dates as get_historical_klines, and returns the same klines.
+
+    Args:
+        symbol: Name of symbol pair e.g BNBBTC.
+        interval: Binance kline interval.
+        start_str: Start date string in UTC format, or a timestamp in milliseconds.
+        end_str: End date string in UTC format, a timestamp in milliseconds, or None for now.
+        client: The binance client, shared by every thread.
+        limiter: The RateLimiter shared by all requests.
+        executor: The thread pool to fetch the windows in.
+        limit: The number of klines to request at once.
+
+    Returns:
+        The list of klines.
+    """
+    timeframe = interval_to_milliseconds(interval)
+    start_ts = start_str if isinstance(start_str, int) else date_to_milliseconds(start_str)
+    if isinstance(end_str, int):
+        end_ts = end_str
+    else:
+        end_ts = date_to_milliseconds(end_str if end_str else "now UTC")
+
+    # The symbol may have been listed after the start date, so find its first candle before splitting.
+    first = get_klines(client, limiter, symbol=symbol, interval=interval, limit=1, startTime=start_ts,
+                       endTime=end_ts)
+    if not first:
+        return []
+    start_ts = first[0][0]
+
+    window = limit * timeframe
+    futures = [executor.submit(get_klines, client, limiter, symbol=symbol, interval=interval, limit=limit,
+                               startTime=window_start, endTime=min(window_start + window - 1, end_ts))
+               for window_start in range(start_ts, end_ts + 1, window)]
+
+    output_data = []
+    for future in futures:
+        output_data += future.result()
+    return output_data
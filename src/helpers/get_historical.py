@@ -57,7 +57,7 @@ def interval_to_milliseconds(interval):
     return ms
 
 
-def get_historical_klines(symbol, interval, start_str, end_str=None):
+def get_historical_klines(symbol, interval, start_str, end_str=None, client=None):
     """Get Historical Klines from Binance
     See dateparse docs for valid start and end string formats http://dateparser.readthedocs.io/en/latest/
     If using offset strings for dates add "UTC" to date string e.g. "now UTC", "11 hours ago UTC"
@@ -65,17 +65,31 @@ def get_historical_klines(symbol, interval, start_str, end_str=None):
     :type symbol: str
     :param interval: Biannce Kline interval
     :type interval: str
-    :param start_str: Start date string in UTC format
-    :type start_str: str
-    :param end_str: optional - end date string in UTC format
-    :type end_str: str
+    :param start_str: Start date string in UTC format, or a timestamp in milliseconds
+    :type start_str: str|int
+    :param end_str: optional - end date string in UTC format, or a timestamp in milliseconds
+    :type end_str: str|int
+    :param client: optional - the client to fetch with, e.g. one pointed at a local stand-in server
+    :type client: binance.client.Client
     :return: list of OHLCV values
     """
-    # create the Binance client, no need for api key
-    client = Client("", "")
-
     # init our list
     output_data = []
+    for page in iter_historical_klines(symbol, interval, start_str, end_str, client):
+        # append this loops data to our output data
+        output_data += page
+
+    return output_data
+
+
+def iter_historical_klines(symbol, interval, start_str, end_str=None, client=None):
+    """Get Historical Klines from Binance one page at a time, so they can be written out as they arrive
+    Takes the same parameters as get_historical_klines
+    :return: generator of lists of up to 500 OHLCV values
+    """
+    # create the Binance client, no need for api key
+    if client is None:
+        client = Client("", "")
 
     # setup the max limit
     limit = 500
@@ -84,11 +98,13 @@ def get_historical_klines(symbol, interval, start_str, end_str=None):
     timeframe = interval_to_milliseconds(interval)
 
     # convert our date strings to milliseconds
-    start_ts = date_to_milliseconds(start_str)
+    start_ts = start_str if isinstance(start_str, int) else date_to_milliseconds(start_str)
 
     # if an end time was passed convert it
     end_ts = None
-    if end_str:
+    if isinstance(end_str, int):
+        end_ts = end_str
+    elif end_str:
         end_ts = date_to_milliseconds(end_str)
 
     idx = 0
@@ -108,9 +124,13 @@ def get_historical_klines(symbol, interval, start_str, end_str=None):
         if not symbol_existed and len(temp_data):
             symbol_existed = True
 
+        # a full final page is followed by an empty one, so there is nothing left to fetch
+        if symbol_existed and not len(temp_data):
+            break
+
         if symbol_existed:
-            # append this loops data to our output data
-            output_data += temp_data
+            # hand this loops data to the caller
+            yield temp_data
 
             # update our start timestamp using the last value in the array and add the interval timeframe
             start_ts = temp_data[len(temp_data) - 1][0] + timeframe
@@ -129,5 +149,3 @@ def get_historical_klines(symbol, interval, start_str, end_str=None):
             time.sleep(1)
 
         print ("Processing another batch")
-
-    return output_data
@@ -0,0 +1,230 @@
+from collections import OrderedDict
+from src.helpers.candle_cache import COLUMNS
+
+import functools
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import numpy as np
+
+
+def fingerprint(value):
+    """Hash the OHLCV columns of a symbol's data, or the ones that were loaded.
+
+    Args:
+        value: The OHLCV DataFrame for a symbol.
+
+    Returns:
+        A hex digest that changes whenever any of the candles change.
+    """
+    digest = hashlib.sha1(str(len(value)).encode())
+    for column in COLUMNS:
+        if column in value:
+            digest.update(column.encode())
+            digest.update(np.ascontiguousarray(value[column].values, dtype=np.float64))
+    return digest.hexdigest()
+
+
+def size_of(result):
+    """Estimate the memory held by a calculated indicator.
+
+    Args:
+        result: A Series, DataFrame or other object.
+
+    Returns:
+        The size in bytes.
+    """
+    if hasattr(result, "memory_usage"):
+        size = result.memory_usage(deep=True)
+        return int(size.sum()) if hasattr(size, "sum") else int(size)
+    return sys.getsizeof(result)
+
+
+def isolated(function):
+    """Wraps an indicator function so it is given a shallow copy of the data.
+
+    Some finta indicators, eg. ADX, add working columns to the DataFrame they are given. The copy shares
+    the candles without copying them, but keeps those columns out of data shared by other models.
+
+    Args:
+        function: The indicator function, eg. TA.ADX.
+
+    Returns:
+        The wrapped function, which keeps the function's name so it shares the same cache entries.
+    """
+    @functools.wraps(function)
+    def calculate(value, **params):
+        return function(value.copy(deep=False), **params)
+    return calculate
+
+
+class IndicatorCache(object):
+    """Memoizes indicator calculations, keyed on symbol, data, indicator and parameters.
+
+    Results are kept in memory in least recently used order up to a byte budget, and optionally
+    written to a directory so they survive between runs. The cache can be shared by models running in
+    several threads.
+
+    Attributes:
+        max_bytes: The memory budget for cached indicators.
+        directory: The directory to store indicators in, or None to only cache in memory.
+        hits: How many calculations have been skipped.
+        misses: How many calculations have been carried out.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, directory=None):
+        """Creates an empty cache.
+
+        Args:
+            max_bytes: The memory budget for cached indicators.
+            directory: An optional directory to store indicators in.
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+        self.last_data = None
+        self.last_fingerprint = None
+        self.lock = threading.RLock()
+
+    def __getstate__(self):
+        """Leaves the cached indicators behind when the cache is sent to another process."""
+        state = self.__dict__.copy()
+        state["entries"] = OrderedDict()
+        state["sizes"] = {}
+        state["total_bytes"] = 0
+        state["last_data"] = None
+        state["last_fingerprint"] = None
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    def calculate(self, function, value, symbol, **params):
+        """Gets an indicator from the cache, calculating it if it isn't there.
+
+        Args:
+            function: The indicator function, eg. TA.RSI.
+            value: The OHLCV DataFrame for the symbol.
+            symbol: The symbol the data belongs to.
+            **params: Any parameters to pass to the function, eg. period.
+
+        Returns:
+            The result of function(value, **params).
+        """
+        with self.lock:
+            # Hashing the data is cheap next to most indicators, but only do it once per DataFrame.
+            if value is not self.last_data:
+                self.last_data = value
+                self.last_fingerprint = fingerprint(value)
+
+            name = "{}.{}".format(function.__module__, getattr(function, "__qualname__", function.__name__))
+            key = (symbol, self.last_fingerprint, name, tuple(sorted(params.items())))
+
+            result = self.get(key)
+            if result is not None:
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        # Calculate outside of the lock, so other threads can carry on using the cache.
+        result = function(value, **params)
+        with self.lock:
+            self.put(key, result)
+            if self.directory is not None:
+                self.write(key, result)
+        return result
+
+    def get(self, key):
+        """Gets a cached indicator from memory, or failing that from disk.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The indicator, or None if it hasn't been cached.
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        path = self.path(key)
+        if path is None or not os.path.exists(path):
+            return None
+
+        with open(path, "rb") as f:
+            result = pickle.load(f)
+        self.put(key, result)
+        return result
+
+    def put(self, key, result):
+        """Adds an indicator to memory, evicting the least recently used ones to stay within budget.
+
+        Args:
+            key: The cache key.
+            result: The calculated indicator.
+        """
+        size = size_of(result)
+        if size > self.max_bytes:
+            return
+
+        if key in self.entries:
+            self.total_bytes -= self.sizes.pop(key)
+            del self.entries[key]
+
+        self.entries[key] = result
+        self.sizes[key] = size
+        self.total_bytes += size
+
+        while self.total_bytes > self.max_bytes:
+            evicted, _ = self.entries.popitem(last=False)
+            self.total_bytes -= self.sizes.pop(evicted)
+
+    def write(self, key, result):
+        """Stores an indicator on disk.
+
+        Args:
+            key: The cache key.
+            result: The calculated indicator.
+        """
+        path = self.path(key)
+        os.makedirs(self.directory, exist_ok=True)
+
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp_path, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    def path(self, key):
+        """Gets the file an indicator is stored in on disk.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The path, or None if the cache has no directory.
+        """
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + ".pkl")
+
+    def clear(self):
+        """Removes every indicator held in memory."""
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.total_bytes = 0
+            self.last_data = None
+            self.last_fingerprint = None
+
+
+# Shared by every model in the process by default, so models using the same indicators reuse them.
+default_cache = IndicatorCache()
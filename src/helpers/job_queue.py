@@ -0,0 +1,238 @@
+from collections import Counter
+
+import contextlib
+import pickle
+import sqlite3
+import time
+import uuid
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    batch TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    payload BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    heartbeat REAL,
+    result BLOB,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch, position);
+"""
+
+
+class JobFailed(Exception):
+    """Raised when a job in a batch has failed on every attempt it was allowed."""
+
+
+class JobQueue(object):
+    """A queue of jobs kept in a SQLite file, which any number of worker processes can claim jobs from.
+
+    Jobs are pickled, claimed one at a time inside a write transaction so no two workers get the same
+    job, and kept alive by heartbeats while they run. A job whose worker stops sending heartbeats for
+    longer than the lease is handed to the next worker that asks, until it runs out of attempts.
+
+    Attributes:
+        path: The SQLite file. Workers on other hosts need it on a filesystem with working file locks.
+        lease: How many seconds a running job can go without a heartbeat before it is retried.
+    """
+
+    def __init__(self, path, lease=60):
+        """Opens a queue, creating the file if it doesn't exist.
+
+        Args:
+            path: The SQLite file.
+            lease: How many seconds a running job can go without a heartbeat before it is retried.
+        """
+        self.path = path
+        self.lease = lease
+        with self.connect() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def connect(self):
+        """Opens a connection for one operation, so the queue can be used from any thread or process."""
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Opens a connection holding the write lock, committing when the block finishes."""
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def submit(self, payloads, max_attempts=3):
+        """Adds a batch of jobs to the queue.
+
+        Args:
+            payloads: The jobs, any picklable objects.
+            max_attempts: How many times each job can be claimed before it is marked as failed.
+
+        Returns:
+            The id of the batch.
+        """
+        batch = uuid.uuid4().hex
+        rows = [(batch, position, pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL), max_attempts)
+                for position, payload in enumerate(payloads)]
+        with self.transaction() as connection:
+            connection.executemany("INSERT INTO jobs (batch, position, payload, max_attempts) VALUES (?, ?, ?, ?)",
+                                   rows)
+        return batch
+
+    def expire(self, connection):
+        """Marks as failed the jobs whose worker stopped sending heartbeats and which have no attempts left.
+
+        Args:
+            connection: An open connection to the queue.
+        """
+        connection.execute("UPDATE jobs SET status = 'failed', error = COALESCE(error, ?) "
+                           "WHERE status = 'running' AND heartbeat < ? AND attempts >= max_attempts",
+                           ("the worker stopped responding", time.time() - self.lease))
+
+    def claim(self, worker):
+        """Claims the oldest job that is waiting, or whose worker has stopped sending heartbeats.
+
+        Args:
+            worker: The name of the worker claiming the job.
+
+        Returns:
+            The id and payload of the job, or None if there are no jobs to run.
+        """
+        with self.transaction() as connection:
+            self.expire(connection)
+            now = time.time()
+            row = connection.execute(
+                "SELECT id, payload FROM jobs "
+                "WHERE status = 'pending' OR (status = 'running' AND heartbeat < ?) ORDER BY id LIMIT 1",
+                (now - self.lease,)).fetchone()
+            if row is None:
+                return None
+
+            job_id, payload = row
+            connection.execute("UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                               "heartbeat = ? WHERE id = ?", (worker, now, job_id))
+            return job_id, pickle.loads(payload)
+
+    def heartbeat(self, job_id, worker):
+        """Tells the queue a job is still running.
+
+        Args:
+            job_id: The job.
+            worker: The worker running it.
+
+        Returns:
+            Whether the worker still holds the job, False if it has been handed to another worker.
+        """
+        with self.connect() as connection:
+            cursor = connection.execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ? "
+                                        "AND status = 'running'", (time.time(), job_id, worker))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker, result):
+        """Stores the result of a job.
+
+        If the job was handed to another worker in the meantime, whichever finishes first is kept.
+
+        Args:
+            job_id: The job.
+            worker: The worker that ran it.
+            result: The result, any picklable object.
+        """
+        with self.connect() as connection:
+            connection.execute("UPDATE jobs SET status = 'done', worker = ?, result = ?, error = NULL "
+                               "WHERE id = ? AND status != 'done'",
+                               (worker, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), job_id))
+
+    def fail(self, job_id, worker, error):
+        """Records that a job raised an error, putting it back on the queue if it has attempts left.
+
+        Args:
+            job_id: The job.
+            worker: The worker that ran it.
+            error: A description of the error, eg. the traceback.
+        """
+        with self.connect() as connection:
+            connection.execute("UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'pending' "
+                               "ELSE 'failed' END, error = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                               (error, job_id, worker))
+
+    def status(self, batch):
+        """Counts the jobs in a batch by status.
+
+        Jobs whose worker stopped responding on their last attempt are marked as failed first, so a batch
+        still finishes when every worker has gone.
+
+        Args:
+            batch: The batch.
+
+        Returns:
+            A Counter keyed on pending, running, done and failed.
+        """
+        with self.transaction() as connection:
+            self.expire(connection)
+            return Counter(dict(connection.execute("SELECT status, COUNT(*) FROM jobs WHERE batch = ? GROUP BY status",
+                                                   (batch,)).fetchall()))
+
+    def results(self, batch):
+        """Reads the results of a finished batch.
+
+        Args:
+            batch: The batch.
+
+        Returns:
+            The results, in the order the jobs were submitted.
+        """
+        with self.connect() as connection:
+            failed = connection.execute("SELECT position, error FROM jobs WHERE batch = ? AND status = 'failed' "
+                                        "ORDER BY position LIMIT 1", (batch,)).fetchone()
+            if failed is not None:
+                raise JobFailed("job {} of batch {} failed: {}".format(failed[0], batch, failed[1]))
+
+            rows = connection.execute("SELECT status, result FROM jobs WHERE batch = ? ORDER BY position",
+                                      (batch,)).fetchall()
+        if any(status != "done" for status, _ in rows):
+            raise ValueError("batch {} hasn't finished".format(batch))
+        return [pickle.loads(result) for _, result in rows]
+
+    def wait(self, batch, poll=1.0, timeout=None):
+        """Waits for every job in a batch to finish, and reads their results.
+
+        Args:
+            batch: The batch.
+            poll: How many seconds to wait between checks.
+            timeout: The most seconds to wait, or None to wait for as long as it takes.
+
+        Returns:
+            The results, in the order the jobs were submitted.
+        """
+        start = time.time()
+        while True:
+            counts = self.status(batch)
+            if counts["failed"] or not (counts["pending"] or counts["running"]):
+                return self.results(batch)
+            if timeout is not None and time.time() - start > timeout:
+                raise TimeoutError("batch {} didn't finish within {}s: {}".format(batch, timeout, dict(counts)))
+            time.sleep(poll)
+
+    def delete(self, batch):
+        """Removes a batch and its results from the queue.
+
+        Args:
+            batch: The batch.
+        """
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM jobs WHERE batch = ?", (batch,))
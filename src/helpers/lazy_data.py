@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+class LazySymbolData(MutableMapping):
+    """A dictionary of OHLCV keyed on symbol, which only reads a symbol's data the first time it is used.
+
+    Attributes:
+        loader: A function taking a symbol and returning its data.
+        symbols: The symbols that can be loaded, in the order they were found.
+        loaded: The data read so far, keyed on symbol.
+    """
+
+    def __init__(self, symbols, loader):
+        """Creates the dictionary without reading anything.
+
+        Args:
+            symbols: The symbols that can be loaded.
+            loader: A function taking a symbol and returning its data.
+        """
+        self.loader = loader
+        self.symbols = OrderedDict.fromkeys(symbols)
+        self.loaded = {}
+
+    def __getitem__(self, symbol):
+        if symbol not in self.loaded:
+            if symbol not in self.symbols:
+                raise KeyError(symbol)
+            self.loaded[symbol] = self.loader(symbol)
+        return self.loaded[symbol]
+
+    def __setitem__(self, symbol, value):
+        self.symbols[symbol] = None
+        self.loaded[symbol] = value
+
+    def __delitem__(self, symbol):
+        del self.symbols[symbol]
+        self.loaded.pop(symbol, None)
+
+    def __contains__(self, symbol):
+        # The default implementation would read the symbol's data just to check for it.
+        return symbol in self.symbols
+
+    def __iter__(self):
+        return iter(list(self.symbols))
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def load_all(self):
+        """Reads the data for every symbol that hasn't been read yet."""
+        for symbol in self.symbols:
+            self[symbol]
+
+    def unload(self, symbol):
+        """Frees a symbol's data, it will be read again the next time it is used.
+
+        Args:
+            symbol: The symbol.
+        """
+        self.loaded.pop(symbol, None)
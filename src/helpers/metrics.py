@@ -0,0 +1,264 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+# Crypto markets trade every day, so a year is 365 days of candles.
+YEAR = 365 * 24 * 60 * 60 * 1000
+
+
+def stack_curves(curves):
+    """Stack equity curves of different lengths into one array, padded with NaN at the end.
+
+    Args:
+        curves: A list of 1 dimensional arrays.
+
+    Returns:
+        A float64 array of shape (len(curves), longest curve).
+    """
+    stacked = np.full((len(curves), max([len(curve) for curve in curves] + [0])), np.nan)
+    for row, curve in enumerate(curves):
+        stacked[row, :len(curve)] = curve
+    return stacked
+
+
+def periods_per_year(timestamps):
+    """Work out how many ticks there are in a year, from the most common gap between them.
+
+    Args:
+        timestamps: The sorted tick times, in milliseconds.
+
+    Returns:
+        The number of ticks per year, or 1 if there are too few ticks to tell.
+    """
+    gaps = np.diff(np.asarray(timestamps, dtype=np.float64))
+    gaps = gaps[gaps > 0]
+    if not len(gaps):
+        return 1
+    return YEAR / np.median(gaps)
+
+
+def equity_metrics(value_points, timestamps=None, periods=None):
+    """Calculate the statistics of one equity curve, or of a batch of them at once.
+
+    Every statistic is worked out for all of the curves together with numpy, so ranking many thousands
+    of runs costs about the same as a few calls on one long curve. Curves of different lengths can be
+    stacked with stack_curves, as the NaN padding is ignored.
+
+    Args:
+        value_points: The value of the account at each tick, either one curve or an array of shape
+            (runs, ticks) with a curve per row.
+        timestamps: The tick times in milliseconds, used to annualise the ratios and time the drawdowns.
+        periods: How many ticks there are in a year, by default worked out from the timestamps.
+
+    Returns:
+        An ordered dictionary of total_return, annual_return, volatility, sharpe, sortino, max_drawdown,
+        max_drawdown_duration (in ticks, or milliseconds with timestamps) and calmar. Each is a float for one
+        curve, or an array with a value per row for a batch, and NaN for empty curves.
+    """
+    values = np.asarray(value_points, dtype=np.float64)
+    single = values.ndim == 1
+    values = np.atleast_2d(values)
+    if periods is None:
+        periods = periods_per_year(timestamps) if timestamps is not None else 1
+
+    names = ("total_return", "annual_return", "volatility", "sharpe", "sortino", "max_drawdown",
+             "max_drawdown_duration", "calmar")
+    if not values.shape[1]:
+        if single:
+            return OrderedDict((name, np.nan) for name in names)
+        return OrderedDict((name, np.full(len(values), np.nan)) for name in names)
+
+    # The NaN padding of shorter curves carries through the returns, and is ignored by the nan functions.
+    valid = ~np.isnan(values)
+    counts = valid.sum(axis=1)
+    rows = np.arange(len(values))
+    first = values[rows, np.argmax(valid, axis=1)]
+    last = values[rows, np.maximum(counts - 1, 0)]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = values[:, 1:] / values[:, :-1] - 1
+        mean = _nan_reduce(np.nanmean, returns)
+        deviation = _nan_reduce(np.nanstd, returns)
+        downside = np.sqrt(_nan_reduce(np.nanmean, np.minimum(returns, 0) ** 2))
+
+        total_return = last / first - 1
+        annual_return = (last / first) ** (periods / np.maximum(counts - 1, 1)) - 1
+        volatility = deviation * np.sqrt(periods)
+        sharpe = np.where(deviation > 0, mean / deviation * np.sqrt(periods), np.nan)
+        sortino = np.where(downside > 0, mean / downside * np.sqrt(periods), np.nan)
+
+        peaks = np.fmax.accumulate(values, axis=1)
+        drawdowns = np.where(valid, 1 - values / peaks, 0)
+        max_drawdown = drawdowns.max(axis=1)
+        calmar = np.where(max_drawdown > 0, annual_return / max_drawdown, np.nan)
+
+    # The longest run of ticks below a previous peak, found from the last tick each run was at its peak.
+    ticks = np.arange(values.shape[1])
+    last_peak = np.maximum.accumulate(np.where(drawdowns > 0, 0, ticks), axis=1)
+    duration = ticks - last_peak
+    if timestamps is not None:
+        times = np.asarray(timestamps, dtype=np.float64)[:values.shape[1]]
+        duration = times - times[last_peak]
+    max_drawdown_duration = duration.max(axis=1)
+
+    metrics = OrderedDict(zip(names, (total_return, annual_return, volatility, sharpe, sortino, max_drawdown,
+                                      max_drawdown_duration, calmar)))
+    if single:
+        return OrderedDict((name, float(value[0])) for name, value in metrics.items())
+    return metrics
+
+
+def _nan_reduce(function, values):
+    """Apply a nan function along the rows of values, giving NaN for rows with nothing in them."""
+    result = np.full(len(values), np.nan)
+    present = (~np.isnan(values)).any(axis=1) if values.shape[1] else np.zeros(len(values), dtype=bool)
+    if present.any():
+        result[present] = function(values[present], axis=1)
+    return result
+
+
+def order_arrays(orders):
+    """Convert an order log into columns.
+
+    Args:
+        orders: The orders logged by AlphaPrototype, a dictionary keyed on symbol of lists of orders.
+
+    Returns:
+        A dictionary of symbol (an index into the dictionary's symbols), is_buy, price and time arrays, and
+        an amount array when every order has the cash amount logged by run_order_history.
+    """
+    sequence = [order for symbol_orders in orders.values() for order in symbol_orders]
+    symbols = {symbol: i for i, symbol in enumerate(orders)}
+    columns = {
+        "symbol": np.array([symbols[order["symbol"]] for order in sequence], dtype=np.int64),
+        "is_buy": np.array([order["type"] == "buy" for order in sequence], dtype=bool),
+        "price": np.array([order["price"] for order in sequence], dtype=np.float64),
+        "time": np.array([order["time"] for order in sequence], dtype=np.float64)
+    }
+    if sequence and all("amount" in order for order in sequence):
+        columns["amount"] = np.array([order["amount"] for order in sequence], dtype=np.float64)
+    return columns
+
+
+def round_trips(orders, slippage=0.0, fees=0.0):
+    """Pair each buy in an order log with the sell that closed it.
+
+    The models only buy when they hold nothing and sell when they hold something, so each symbol's
+    orders alternate, and a buy followed by a sell of the same symbol is one trade. A buy left open
+    at the end of the log is not counted.
+
+    Args:
+        orders: The orders logged by AlphaPrototype, or the trades logged by run_order_history, as a
+            dictionary keyed on symbol of lists of orders, or the columns from order_arrays.
+        slippage: The slippage applied to each order, 0.01 for 1%, as in AlphaPrototype.slippage.
+        fees: The fees taken from each order, 0.001 for 0.1%, as in AlphaPrototype.fees.
+
+    Returns:
+        A dictionary of symbol, entry_time, exit_time, entry_price, exit_price, duration and return arrays,
+        with an entry per trade. The return is after slippage and fees on both orders. For trades with the
+        cash amounts logged by run_order_history, it is the cash returned over the cash spent, which already
+        includes the costs of that run, and slippage and fees are not applied again.
+    """
+    columns = orders if "is_buy" in orders else order_arrays(orders)
+    symbol, is_buy = columns["symbol"], columns["is_buy"]
+    entries = np.flatnonzero(is_buy[:-1] & ~is_buy[1:] & (symbol[:-1] == symbol[1:]))
+    exits = entries + 1
+
+    entry_price = columns["price"][entries]
+    exit_price = columns["price"][exits]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if "amount" in columns:
+            returns = columns["amount"][exits] / -columns["amount"][entries] - 1
+        else:
+            returns = exit_price * (1 - slippage) * (1 - fees) ** 2 / (entry_price * (1 + slippage)) - 1
+
+    return {
+        "symbol": symbol[entries],
+        "entry_time": columns["time"][entries],
+        "exit_time": columns["time"][exits],
+        "entry_price": entry_price,
+        "exit_price": exit_price,
+        "duration": columns["time"][exits] - columns["time"][entries],
+        "return": returns
+    }
+
+
+def trade_metrics(returns, durations, runs=None, count=None, span=None):
+    """Calculate the statistics of the trades of one run, or of a batch of runs at once.
+
+    Args:
+        returns: The return of each trade.
+        durations: How long each trade was held, in milliseconds.
+        runs: An optional array giving the run each trade belongs to, to calculate a batch of runs at once.
+        count: How many runs there are, by default one more than the largest run.
+        span: The time the run covers in milliseconds, or an array of them per run, to give the exposure.
+
+    Returns:
+        An ordered dictionary of trades, win_rate, average_return, best_trade, worst_trade, profit_factor,
+        average_duration, max_duration and, with a span, exposure. Each is a float for one run, or an array
+        with a value per run for a batch.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+    single = runs is None
+    runs = np.zeros(len(returns), dtype=np.int64) if single else np.asarray(runs, dtype=np.int64)
+    count = (1 if single else int(runs.max()) + 1 if len(runs) else 0) if count is None else count
+
+    trades = np.bincount(runs, minlength=count).astype(np.float64)
+    wins = np.bincount(runs, returns > 0, minlength=count)
+    gains = np.bincount(runs, np.maximum(returns, 0), minlength=count)
+    losses = np.bincount(runs, np.maximum(-returns, 0), minlength=count)
+    total_duration = np.bincount(runs, durations, minlength=count)
+
+    best = np.full(count, np.nan)
+    worst = np.full(count, np.nan)
+    longest = np.zeros(count)
+    if len(returns):
+        np.fmax.at(best, runs, returns)
+        np.fmin.at(worst, runs, returns)
+        np.maximum.at(longest, runs, durations)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics = OrderedDict([
+            ("trades", trades),
+            ("win_rate", wins / trades),
+            ("average_return", np.bincount(runs, returns, minlength=count) / trades),
+            ("best_trade", best),
+            ("worst_trade", worst),
+            ("profit_factor", np.where(losses > 0, gains / losses, np.where(gains > 0, np.inf, np.nan))),
+            ("average_duration", total_duration / trades),
+            ("max_duration", longest)
+        ])
+        if span is not None:
+            metrics["exposure"] = total_duration / np.asarray(span, dtype=np.float64)
+
+    if single:
+        return OrderedDict((name, float(value[0])) for name, value in metrics.items())
+    return metrics
+
+
+def metrics(result, orders=None, slippage=0.0, fees=0.0):
+    """Calculate the standard statistics of a run.
+
+    Args:
+        result: The PortfolioResult of the run, eg. from run_order_history.
+        orders: The run's order log to take the trades from, by default result.trades, whose returns are
+            taken from the cash amounts logged with each trade, so include the costs of the run.
+        slippage: The slippage applied to each order of the order log, 0.01 for 1%.
+        fees: The fees taken from each order of the order log, 0.001 for 0.1%.
+
+    Returns:
+        An ordered dictionary of the equity_metrics and trade_metrics of the run. The exposure is the share of
+        the run's time each symbol was held, averaged over the symbols.
+    """
+    if orders is None:
+        orders = {}
+        for trade in result.trades:
+            orders.setdefault(trade["symbol"], []).append(trade)
+
+    trips = round_trips(orders, slippage, fees)
+    span = result.timestamps[-1] - result.timestamps[0] if len(result.timestamps) > 1 else np.nan
+    statistics = equity_metrics(result.value_points, result.timestamps)
+    statistics.update(trade_metrics(trips["return"], trips["duration"], span=span * max(len(orders), 1)))
+    return statistics
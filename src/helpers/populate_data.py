@@ -1,26 +1,278 @@
 from binance.client import Client
-from src.helpers.get_historical import get_historical_klines
+from concurrent.futures import ThreadPoolExecutor
+from src.helpers.candle_cache import CACHE_DIRECTORY
+from src.helpers.concurrent_fetch import RateLimiter, create_client, get_historical_klines_concurrent
+from src.helpers.get_historical import get_historical_klines, interval_to_milliseconds, iter_historical_klines
 
 import json
+import os
+
+
+def _find_last_kline(file_path):
+    """Find the last kline in a file written by get_symbol_history, without parsing the whole file.
+
+    Args:
+        file_path: The path of the JSON candle file.
+
+    Returns:
+        A tuple of the last kline, the byte offset it starts at and the byte offset of the closing bracket
+        of the file, with the kline and its offset None if the file has no klines.
+    """
+    with open(file_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+
+        # Klines have no nested lists, so the last one starts at the last opening bracket.
+        tail_size = 4096
+        while True:
+            f.seek(max(size - tail_size, 0))
+            tail = f.read()
+            start = tail.rfind(b"[")
+            if start > 0 or tail_size >= size:
+                break
+            tail_size *= 2
+
+    offset = size - len(tail)
+    end = tail.rfind(b"]")
+    if offset + start == 0:
+        return None, None, offset + end
+
+    return json.loads(tail[start:end].decode()), offset + start, offset + end
+
+
+def read_last_kline(file_path):
+    """Read the last kline in a file written by get_symbol_history.
+
+    Args:
+        file_path: The path of the JSON candle file.
+
+    Returns:
+        The last kline, or None if the file has no klines.
+    """
+    return _find_last_kline(file_path)[0]
+
+
+def append_klines(file_path, klines):
+    """Add klines to the end of a file written by get_symbol_history.
+
+    If the first new kline has the same open time as the last stored one, it replaces it, as the stored
+    candle may not have closed when it was downloaded.
+
+    Args:
+        file_path: The path of the JSON candle file.
+        klines: The klines to add, in time order.
+    """
+    if not klines:
+        return
+    _append_rows(file_path, [json.dumps(kline) for kline in klines], klines[0][0])
+
+
+def _append_rows(file_path, rows, first_time):
+    """Write a copy of a candle file with rows added to the end, then swap it in for the original.
+
+    The original is never written to, so an interruption can't leave the stored history cut short.
+
+    Args:
+        file_path: The path of the JSON candle file.
+        rows: The klines to add, as JSON strings, in time order.
+        first_time: The open time of the first of the klines.
+    """
+    last, start, end = _find_last_kline(file_path)
+    cut, separator = (start, "") if last is not None and first_time == last[0] else (end, ", " if last else "")
+
+    temp_path = os.path.splitext(part_path(file_path, update=True))[0] + ".tmp"
+    os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+    with open(file_path, "rb") as source, open(temp_path, "wb") as f:
+        remaining = cut
+        while remaining:
+            chunk = source.read(min(remaining, 1024 * 1024))
+            f.write(chunk)
+            remaining -= len(chunk)
+        for row in rows:
+            f.write((separator + row).encode())
+            separator = ", "
+        f.write(b"]")
+    os.replace(temp_path, file_path)
+
+
+def part_path(file_path, update=False):
+    """Get the location of the partial download of a candle file.
+
+    The partial download is kept in the same hidden sub-folder as the candle cache, so a data directory
+    holding an interrupted download can still be tested on.
+
+    Args:
+        file_path: The path of the JSON candle file.
+        update: Whether the download adds to the end of the file, rather than replacing it.
+
+    Returns:
+        The path of the .part file, which holds one kline per line.
+    """
+    directory, file_name = os.path.split(file_path)
+    return os.path.join(directory, CACHE_DIRECTORY, file_name + (".update.part" if update else ".part"))
+
+
+def read_part_checkpoint(path):
+    """Find the last kline of a partial download, dropping a line left half written by an interruption.
+
+    Args:
+        path: The path of the .part file.
+
+    Returns:
+        The last complete kline, or None if there isn't one.
+    """
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+
+        # Read back from the end until there is a whole line to look at.
+        tail_size = 4096
+        while True:
+            f.seek(max(size - tail_size, 0))
+            tail = f.read()
+            end = tail.rfind(b"\n")
+            start = tail.rfind(b"\n", 0, end) if end >= 0 else -1
+            if start >= 0 or tail_size >= size:
+                break
+            tail_size *= 2
+
+        # Anything after the last newline was cut off part way through writing.
+        f.truncate(size - len(tail) + end + 1)
+
+    if end < 0:
+        return None
+    return json.loads(tail[start + 1:end].decode())
+
+
+def finish_part(path, file_path, update=False):
+    """Convert a finished partial download into a candle file, one line at a time.
+
+    Args:
+        path: The path of the .part file.
+        file_path: The path of the JSON candle file to write.
+        update: Whether to add the klines to the end of the existing file, rather than replacing it.
+    """
+    if update:
+        with open(path) as part:
+            first = part.readline()
+            if first:
+                part.seek(0)
+                _append_rows(file_path, (line.rstrip("\n") for line in part), json.loads(first)[0])
+        os.remove(path)
+        return
+
+    temp_path = os.path.splitext(path)[0] + ".tmp"
+    with open(path) as part, open(temp_path, "w") as f:
+        f.write("[")
+        separator = ""
+        for line in part:
+            f.write(separator + line.rstrip("\n"))
+            separator = ", "
+        f.write("]")
+    os.replace(temp_path, file_path)
+    os.remove(path)
+
+
+def stream_symbol_history(file_path, symbol, interval, start, end=None, client=None, update=False):
+    """Download a symbol's klines a page at a time, writing each page to disk as it arrives.
+
+    The pages are appended to a .part file of one kline per line, which is synced after each page, so
+    only one page is ever held in memory. When the download is interrupted, the next call carries on
+    from the last kline in the .part file. Once every page is written, the .part file is converted into
+    the JSON candle file, or added to the end of it for an update, and the file is only replaced once
+    the new one is complete.
+
+    Args:
+        file_path: The path of the JSON candle file to write.
+        symbol: The symbol we want the data for.
+        interval: The candle interval, eg. 1 hour, as a binance enum.
+        start: The start date, or a timestamp in milliseconds.
+        end: The end date, a timestamp in milliseconds, or None for the latest candle.
+        client: An optional binance client to fetch with.
+        update: Whether to add the klines to the end of the existing file, rather than replacing it.
+    """
+    path = part_path(file_path, update)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        last = read_part_checkpoint(path)
+        if last is not None:
+            start = last[0] + interval_to_milliseconds(interval)
+
+    with open(path, "a") as f:
+        for page in iter_historical_klines(symbol, interval, start, end, client=client):
+            f.write("".join(json.dumps(kline) + "\n" for kline in page))
+            f.flush()
+            os.fsync(f.fileno())
+
+    finish_part(path, file_path, update)
+
+
+def fetch_klines(symbol, interval, start, end, client=None, limiter=None, executor=None):
+    """Fetch klines one page at a time, or concurrently if there is a thread pool to fetch them in.
+
+    Args:
+        symbol: The symbol we want the data for.
+        interval: The candle interval, eg. 1 hour, as a binance enum.
+        start: The start date, or a timestamp in milliseconds.
+        end: The end date, a timestamp in milliseconds, or None for the latest candle.
+        client: An optional binance client to fetch with.
+        limiter: The RateLimiter shared by concurrent requests.
+        executor: An optional thread pool to fetch windows of the time range in.
+
+    Returns:
+        The list of klines.
+    """
+    if executor is None:
+        return get_historical_klines(symbol, interval, start, end, client=client)
+    return get_historical_klines_concurrent(symbol, interval, start, end, client, limiter, executor)
 
 
 def get_symbol_history(path, symbol, interval=Client.KLINE_INTERVAL_1HOUR,
-                  start="30 January, 2016", end="1 April, 2019"):
+                  start="30 January, 2016", end="1 April, 2019", update=False, client=None,
+                  limiter=None, executor=None):
     """Populate a directory with data within a date range and interval for a symbol.
 
+    The data is written to <symbol>_<interval>.json, so a directory can hold several intervals of a symbol.
+    Without a thread pool, the klines are written out a page at a time as they are downloaded, and an
+    interrupted download carries on from where it stopped the next time it is run.
+
     Args:
         path: The directory in which to store the data.
         symbol: The symbol we want the data for.
         interval: The candle interval, eg. 1 hour, as a binance enum.
         start: The start date.
-        end: The end date.
+        end: The end date, or None for the latest candle.
+        update: If there is already a file for the symbol, only fetch and append the candles after the
+            last one in it, rather than downloading everything from the start date.
+        client: An optional binance client to fetch with, eg. one pointed at a local stand-in server.
+        limiter: The RateLimiter shared by concurrent requests.
+        executor: An optional thread pool to fetch windows of the time range in concurrently.
     """
-    klines = get_historical_klines(symbol, interval, start, end)
-    with open("{}/{}_1h.json".format(path, symbol), 'w') as f:
+    file_path = "{}/{}_{}.json".format(path, symbol, interval)
+
+    if update and os.path.exists(file_path):
+        last = read_last_kline(file_path)
+        if last is not None:
+            # Fetch from the last stored candle, so it is refreshed if it was still open.
+            if executor is None:
+                stream_symbol_history(file_path, symbol, interval, last[0], end, client, update=True)
+                return
+
+            klines = fetch_klines(symbol, interval, last[0], end, client, limiter, executor)
+            append_klines(file_path, klines)
+            return
+
+    if executor is None:
+        stream_symbol_history(file_path, symbol, interval, start, end, client)
+        return
+
+    klines = fetch_klines(symbol, interval, start, end, client, limiter, executor)
+    with open(file_path, 'w') as f:
         f.write(json.dumps(klines))
 
 def populate_data(path, base_currency="ETH", interval=Client.KLINE_INTERVAL_1HOUR,
-                  start="30 January, 2016", end="1 April, 2019"):
+                  start="30 January, 2016", end="1 April, 2019", update=False, client=None, workers=1,
+                  weight_per_minute=1200):
     """Populate a directory for data within a time range and interval for a base asset.
 
     Args:
@@ -28,18 +280,33 @@ def populate_data(path, base_currency="ETH", interval=Client.KLINE_INTERVAL_1HOU
         base_currency: The base asset we want the data for.
         interval: The candle interval, eg. 1 hour, as a binance enum.
         start: The start date.
-        end: The end date.
+        end: The end date, or None for the latest candle.
+        update: Only fetch and append the candles missing from files that already exist.
+        client: An optional binance client to fetch with, eg. one pointed at a local stand-in server.
+        workers: How many requests to make at once, 1 fetches one page at a time.
+        weight_per_minute: The request weight the exchange allows each minute, shared by all workers.
     """
     symbols = []
 
-    client = Client("", "")
+    if client is None:
+        client = create_client(pool_size=workers)
     tickers = client.get_all_tickers()
     for ticker in tickers:
         symbol = ticker['symbol']
         if symbol.endswith(base_currency):
             symbols.append(symbol)
 
-    for symbol in symbols:
-        klines = get_historical_klines(symbol, interval, start, end)
-        with open("{}/{}_1h.json".format(path, symbol), 'w') as f:
-            f.write(json.dumps(klines))
+    if workers == 1:
+        for symbol in symbols:
+            get_symbol_history(path, symbol, interval, start, end, update=update, client=client)
+        return
+
+    # Symbols are downloaded side by side, with their pages fetched by a separate pool of threads.
+    limiter = RateLimiter(weight_per_minute)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        with ThreadPoolExecutor(max_workers=workers) as symbol_executor:
+            futures = [symbol_executor.submit(get_symbol_history, path, symbol, interval, start, end, update,
+                                              client, limiter, executor)
+                       for symbol in symbols]
+            for future in futures:
+                future.result()
@@ -0,0 +1,170 @@
+from collections import OrderedDict
+
+import json
+import os
+import numpy as np
+import pandas as pd
+
+
+class PricePanel(object):
+    """Every symbol's candles aligned on one time axis, in memory-mapped files that processes share.
+
+    The candles are kept in a single (symbol, column, time) array, with each symbol's candles filling
+    its own stretch of the shared time axis, so a symbol's columns are contiguous rows. Processes open the
+    files read-only and share the operating system's page cache, so the memory used stays the same however
+    many processes read from the panel. A panel is pickled as its directory, so it can be sent to worker
+    processes, which open the files again rather than receiving a copy of the data.
+
+    Attributes:
+        directory: The directory the panel is stored in.
+        symbols: An ordered dictionary of each symbol's position in the panel.
+        columns: The names of the candle columns, time first.
+        times: The shared time axis, the sorted open times of every symbol's candles.
+        values: A read-only array of shape (symbols, columns - 1, times), NaN where a symbol has no candle.
+        valid: A read-only boolean array of shape (symbols, times), True where a symbol has a candle.
+        ranges: An array of shape (symbols, 2), of the first and last + 1 position of each symbol's candles.
+        dense: A boolean array, True for symbols with a candle at every time within their range.
+    """
+
+    def __init__(self, directory):
+        """Opens a panel written by build_panel.
+
+        Args:
+            directory: The directory the panel is stored in.
+        """
+        self.directory = directory
+        with open(os.path.join(directory, "index.json")) as f:
+            index = json.load(f)
+
+        self.symbols = OrderedDict((symbol, i) for i, symbol in enumerate(index["symbols"]))
+        self.columns = tuple(index["columns"])
+        self.times = np.load(os.path.join(directory, "times.npy"), mmap_mode="r")
+        self.values = np.load(os.path.join(directory, "values.npy"), mmap_mode="r")
+        self.valid = np.load(os.path.join(directory, "valid.npy"), mmap_mode="r")
+        self.ranges = np.array(index["ranges"], dtype=np.int64).reshape(-1, 2)
+        self.dense = np.array(index["dense"], dtype=bool)
+
+    def __getstate__(self):
+        return {"directory": self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state["directory"])
+
+    def __contains__(self, symbol):
+        return symbol in self.symbols
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.values.nbytes + self.valid.nbytes
+
+    def arrays(self, symbol):
+        """Gets a symbol's candles as arrays.
+
+        Args:
+            symbol: The symbol.
+
+        Returns:
+            An ordered dictionary of arrays keyed on column, views of the panel unless the symbol has gaps
+            within its range, in which case only its own candles are copied out.
+        """
+        position = self.symbols[symbol]
+        start, end = self.ranges[position]
+        times = self.times[start:end]
+        rows = self.values[position, :, start:end]
+        if not self.dense[position]:
+            present = self.valid[position, start:end]
+            times = times[present]
+            rows = rows[:, present]
+
+        return OrderedDict([(self.columns[0], times)] +
+                           [(column, rows[i]) for i, column in enumerate(self.columns[1:])])
+
+    def frame(self, symbol):
+        """Gets a symbol's candles as a DataFrame, in the same form as symbol_data.
+
+        Args:
+            symbol: The symbol.
+
+        Returns:
+            A DataFrame whose columns are views of the panel, for symbols without gaps.
+        """
+        return pd.DataFrame(self.arrays(symbol), columns=list(self.columns), copy=False)
+
+    def field(self, column):
+        """Gets one column of every symbol, aligned on the shared time axis.
+
+        Args:
+            column: The column, eg. close.
+
+        Returns:
+            A read-only view of shape (symbols, times), NaN where a symbol has no candle.
+        """
+        return self.values[:, self.columns.index(column) - 1]
+
+
+def build_panel(model, directory):
+    """Writes the candles of every one of a model's symbols into a PricePanel.
+
+    The symbols are read one at a time with the model's settings, eg. its time window, columns, interval
+    and compact storage, and written straight into the memory-mapped files. A first pass only reads each
+    symbol's time column to lay out the shared time axis, so the memory used is the time axis plus one
+    symbol's candles, however many symbols there are.
+
+    Args:
+        model: The model, with its data files found.
+        directory: The directory to store the panel in.
+
+    Returns:
+        The PricePanel.
+    """
+    symbols = list(model.symbol_files)
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(os.path.join(directory, "index.json")):
+        os.remove(os.path.join(directory, "index.json"))
+
+    # Only the time column is read to lay out the shared time axis, merging in one symbol at a time.
+    times = np.empty(0)
+    for symbol in symbols:
+        times = np.union1d(times, model.select_candles(model.symbol_files[symbol])[0])
+
+    first = model.read_symbol(model.symbol_files[symbols[0]]) if symbols else None
+    time_dtype = first["time"].dtype if first is not None else np.float64
+    price_dtype = first[model.columns[1]].dtype if first is not None else np.float64
+    np.save(os.path.join(directory, "times.npy"), times.astype(time_dtype))
+
+    values = np.lib.format.open_memmap(os.path.join(directory, "values.npy"), mode="w+", dtype=price_dtype,
+                                       shape=(len(symbols), len(model.columns) - 1, len(times)))
+    valid = np.lib.format.open_memmap(os.path.join(directory, "valid.npy"), mode="w+", dtype=bool,
+                                      shape=(len(symbols), len(times)))
+
+    ranges = []
+    dense = []
+    for position, symbol in enumerate(symbols):
+        value = first if position == 0 else model.read_symbol(model.symbol_files[symbol])
+        rows = np.searchsorted(times, value["time"].values)
+        start, end = (int(rows[0]), int(rows[-1]) + 1) if len(rows) else (0, 0)
+
+        values[position] = np.nan
+        valid[position] = False
+        for i, column in enumerate(model.columns[1:]):
+            values[position, i, rows] = value[column].values
+        valid[position, rows] = True
+        ranges.append([start, end])
+        dense.append(end - start == len(rows))
+        first = None
+
+    values.flush()
+    valid.flush()
+    del values, valid
+
+    # The index is written last, so a panel is only opened once it is complete.
+    index = {"symbols": symbols, "columns": list(model.columns), "ranges": ranges, "dense": dense}
+    temp_path = os.path.join(directory, "index.json.tmp")
+    with open(temp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(temp_path, os.path.join(directory, "index.json"))
+
+    return PricePanel(directory)
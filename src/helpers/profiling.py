@@ -0,0 +1,248 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+import pandas as pd
+
+
+class _NullPhase(object):
+    """A context manager that does nothing, shared by every phase when profiling is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class NullProfiler(object):
+    """Stands in for a Profiler when instrumentation is turned off, so the hooks cost next to nothing."""
+
+    null_phase = _NullPhase()
+
+    def phase(self, name, symbol=None):
+        return self.null_phase
+
+    def profile(self, symbol):
+        return self.null_phase
+
+    def merge(self, other):
+        return
+
+    def spawn(self):
+        return self
+
+    def close(self):
+        return
+
+
+null_profiler = NullProfiler()
+
+
+class _Phase(object):
+    """Times one run of a phase, and tracks its peak memory if the profiler is tracing allocations."""
+
+    def __init__(self, profiler, key):
+        self.profiler = profiler
+        self.key = key
+
+    def __enter__(self):
+        if self.profiler.track_memory:
+            self.start_memory = self.profiler.enter_memory()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.start
+        peak = self.profiler.exit_memory() - self.start_memory if self.profiler.track_memory else 0
+
+        record = self.profiler.records.setdefault(self.key, [0, 0.0, 0])
+        record[0] += 1
+        record[1] += elapsed
+        record[2] = max(record[2], peak)
+        return False
+
+
+class Profiler(object):
+    """Records the wall time, call count and peak memory of each phase of a run, per symbol.
+
+    A profiler that starts tracing allocations stops again when it is closed, either by close(), at the end of
+    a with block, or once its results are printed or reported.
+
+    Attributes:
+        track_memory: Whether to trace allocations to measure peak memory, which slows the run down.
+        profile_symbol: A symbol to run cProfile over the trading rules for, or None.
+        records: A dictionary keyed on (phase, symbol), of the calls, seconds and peak bytes.
+        profile_stats: The cProfile output for profile_symbol, once it has been run.
+        started_tracing: Whether this profiler started tracemalloc, and so should stop it.
+    """
+
+    def __init__(self, track_memory=False, profile_symbol=None):
+        """Creates an empty profiler.
+
+        Args:
+            track_memory: Whether to measure the peak memory of each phase with tracemalloc.
+            profile_symbol: An optional symbol to profile the step() loop or signals for.
+        """
+        self.track_memory = track_memory
+        self.profile_symbol = profile_symbol
+        self.records = {}
+        self.profile_stats = None
+        self.peaks = []
+        self.started_tracing = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def __getstate__(self):
+        # Tracing belongs to the process that started it, so a copy sent elsewhere never stops it.
+        state = self.__dict__.copy()
+        state["started_tracing"] = False
+        return state
+
+    def close(self):
+        """Stops tracing allocations if this profiler started it, once no phase is being measured."""
+        if self.started_tracing and not self.peaks:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self.started_tracing = False
+
+    def phase(self, name, symbol=None):
+        """Time a phase of the run.
+
+        Args:
+            name: The name of the phase, eg. load_data.
+            symbol: The symbol the phase is working on, if any.
+
+        Returns:
+            A context manager to wrap the phase in.
+        """
+        return _Phase(self, (name, symbol))
+
+    def enter_memory(self):
+        """Starts measuring the peak memory of a phase, keeping the peak of any phase it is nested in."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+        current, peak = tracemalloc.get_traced_memory()
+        if self.peaks:
+            self.peaks[-1] = max(self.peaks[-1], peak)
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        self.peaks.append(current)
+        return current
+
+    def exit_memory(self):
+        """Finishes measuring the peak memory of a phase.
+
+        Returns:
+            The peak number of bytes traced during the phase.
+        """
+        peak = max(self.peaks.pop(), tracemalloc.get_traced_memory()[1])
+        if self.peaks:
+            self.peaks[-1] = max(self.peaks[-1], peak)
+        return peak
+
+    def profile(self, symbol):
+        """Profile the trading rules for a symbol, if it is the one chosen.
+
+        Args:
+            symbol: The symbol about to be simulated.
+
+        Returns:
+            A context manager to wrap the simulation in.
+        """
+        if symbol != self.profile_symbol:
+            return NullProfiler.null_phase
+        return _Profile(self)
+
+    def spawn(self):
+        """Creates an empty profiler with the same settings, eg. for a worker process.
+
+        Returns:
+            The new Profiler.
+        """
+        return Profiler(self.track_memory, self.profile_symbol)
+
+    def merge(self, other):
+        """Adds the records from another profiler, eg. one used by a worker process.
+
+        Args:
+            other: The other Profiler.
+        """
+        for key, (calls, seconds, peak) in other.records.items():
+            record = self.records.setdefault(key, [0, 0.0, 0])
+            record[0] += calls
+            record[1] += seconds
+            record[2] = max(record[2], peak)
+        if other.profile_stats is not None:
+            self.profile_stats = other.profile_stats
+
+    def rows(self):
+        """Get the records as a list of dictionaries, slowest first."""
+        rows = [{"phase": phase, "symbol": symbol, "calls": calls, "seconds": seconds, "peak_memory": peak}
+                for (phase, symbol), (calls, seconds, peak) in self.records.items()]
+        return sorted(rows, key=lambda row: row["seconds"], reverse=True)
+
+    def summary(self):
+        """Summarise the time spent in each phase.
+
+        Returns:
+            A DataFrame with a row per phase and symbol, slowest first.
+        """
+        summary = pd.DataFrame(self.rows(), columns=["phase", "symbol", "calls", "seconds", "peak_memory"])
+        return summary.sort_values("seconds", ascending=False).reset_index(drop=True)
+
+    def print_summary(self):
+        """Print the time spent in each phase, totalled over the symbols, and close the profiler."""
+        self.close()
+        summary = self.summary()
+        totals = summary.groupby("phase").agg({"calls": "sum", "seconds": "sum", "peak_memory": "max"})
+        print (totals.sort_values("seconds", ascending=False).to_string())
+        if self.profile_stats is not None:
+            print (self.profile_stats)
+
+    def report(self, path=None):
+        """Build a machine readable report of the run, and close the profiler.
+
+        Args:
+            path: An optional file to write the report to as JSON.
+
+        Returns:
+            The report as a dictionary.
+        """
+        self.close()
+        report = {
+            "phases": self.rows(),
+            "profile": {"symbol": self.profile_symbol, "stats": self.profile_stats}
+        }
+        if path is not None:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+        return report
+
+
+class _Profile(object):
+    """Runs cProfile over a block, and stores the 30 most expensive calls on the profiler."""
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.cprofile = cProfile.Profile()
+
+    def __enter__(self):
+        self.cprofile.enable()
+        return self
+
+    def __exit__(self, *args):
+        self.cprofile.disable()
+        output = io.StringIO()
+        pstats.Stats(self.cprofile, stream=output).sort_stats("cumulative").print_stats(30)
+        self.profiler.profile_stats = output.getvalue()
+        return False
@@ -0,0 +1,161 @@
+from src.helpers.candle_cache import COLUMNS, cache_path, load_candles, read_candles
+from src.helpers.get_historical import interval_to_milliseconds
+
+import os
+import numpy as np
+
+
+# Weekly candles open on a Monday, four days after the epoch, rather than on the Thursday it fell on.
+BUCKET_OFFSETS = {"w": 4 * 24 * 60 * 60 * 1000}
+
+
+def file_symbol(file_name):
+    """Get the symbol of a data file, from the name written by get_symbol_history.
+
+    Args:
+        file_name: The name of the data file, eg. ETHBTC_1h.json, or ETHBTC.json without an interval.
+
+    Returns:
+        The symbol, eg. ETHBTC.
+    """
+    return os.path.splitext(os.path.basename(file_name))[0].split("_")[0]
+
+
+def file_interval(file_name):
+    """Get the candle interval of a data file, from the name written by get_symbol_history.
+
+    Args:
+        file_name: The name of the data file, eg. ETHBTC_1h.json.
+
+    Returns:
+        The interval string, eg. 1h, or None if the name doesn't include one.
+    """
+    parts = os.path.splitext(os.path.basename(file_name))[0].split("_")
+    if len(parts) < 2 or not parts[-1] or interval_to_milliseconds(parts[-1]) is None:
+        return None
+    return parts[-1]
+
+
+def bucket_times(times, interval):
+    """Find the open time of the candle of a larger interval that each candle falls in.
+
+    Args:
+        times: The open times of the candles, in milliseconds.
+        interval: The larger interval, eg. 4h, as a binance interval string.
+
+    Returns:
+        An int64 array of the open times of the buckets.
+    """
+    milliseconds = interval_to_milliseconds(interval)
+    if milliseconds is None:
+        raise ValueError("unknown interval {}".format(interval))
+
+    offset = BUCKET_OFFSETS.get(interval[-1], 0)
+    times = np.asarray(times, dtype=np.int64)
+    return (times - offset) // milliseconds * milliseconds + offset
+
+
+def resample_candles(candles, interval, columns=COLUMNS):
+    """Aggregates sorted candles into candles of a larger interval.
+
+    Each bucket takes the first open, highest high, lowest low, last close and total volume of the
+    candles that fall in it. Buckets with no candles are left out, and the last bucket holds whatever
+    candles there are, so it may not have closed yet, as with the latest candle from the exchange.
+
+    Args:
+        candles: A float64 array with one row per column, time first, sorted by time.
+        interval: The interval to aggregate to, eg. 4h, as a binance interval string.
+        columns: The names of the rows of candles.
+
+    Returns:
+        A float64 array of shape (len(columns), m), one row per column, timed at the start of each bucket.
+    """
+    if candles.shape[1] == 0:
+        return np.empty((len(columns), 0))
+
+    buckets = bucket_times(candles[0], interval)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+
+    aggregations = {
+        "time": lambda row: buckets[starts],
+        "open": lambda row: row[starts],
+        "high": lambda row: np.maximum.reduceat(row, starts),
+        "low": lambda row: np.minimum.reduceat(row, starts),
+        "close": lambda row: row[ends],
+        "volume": lambda row: np.add.reduceat(row, starts)
+    }
+
+    resampled = np.empty((len(columns), len(starts)))
+    for i, column in enumerate(columns):
+        resampled[i] = aggregations[column](np.asarray(candles[i]))
+    return resampled
+
+
+def resampled_path(file_path, interval):
+    """Get the location of the cache for a candle file resampled to another interval.
+
+    Args:
+        file_path: The path of the JSON candle file.
+        interval: The interval it is resampled to.
+
+    Returns:
+        The path of the .npy cache file, next to the file's own binary cache.
+    """
+    base, extension = os.path.splitext(cache_path(file_path))
+    return "{}.{}{}".format(base, interval, extension)
+
+
+def load_resampled(file_path, interval, use_cache=True):
+    """Load the candles of a file resampled to a larger interval.
+
+    With the cache, each interval is only calculated once, and again whenever the JSON is newer than it,
+    so that a new download of the data invalidates every interval built from it.
+
+    Args:
+        file_path: The path of the JSON candle file.
+        interval: The interval to aggregate to, eg. 4h, as a binance interval string.
+        use_cache: Whether to read and write the resampled candles through the binary cache.
+
+    Returns:
+        A float64 array of shape (6, m), one row per column in COLUMNS, memory-mapped when using the cache.
+    """
+    if not use_cache:
+        return resample_candles(read_candles(file_path), interval)
+
+    path = resampled_path(file_path, interval)
+    if not os.path.exists(path) or os.stat(path).st_mtime_ns < os.stat(file_path).st_mtime_ns:
+        resampled = resample_candles(load_candles(file_path), interval)
+
+        # Write to a temporary file first so an interrupted build never leaves a partial cache behind.
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp_path, "wb") as f:
+            np.save(f, resampled)
+        os.replace(temp_path, path)
+
+    return np.load(path, mmap_mode="r")
+
+
+def align_timeframe(values, higher_times, interval, times, base_interval):
+    """Line the values of a larger interval up with candles of a smaller one, without looking ahead.
+
+    Each candle is given the value of the latest larger candle that had closed by the time it closed.
+
+    Args:
+        values: The values of the larger interval, eg. an indicator, one per larger candle.
+        higher_times: The open times of the larger candles.
+        interval: The larger interval, eg. 4h.
+        times: The open times of the smaller candles.
+        base_interval: The smaller interval, eg. 1h.
+
+    Returns:
+        A float64 array the length of times, NaN before the first larger candle closes.
+    """
+    closes = np.asarray(higher_times, dtype=np.int64) + interval_to_milliseconds(interval)
+    seen = np.asarray(times, dtype=np.int64) + interval_to_milliseconds(base_interval)
+    indices = np.searchsorted(closes, seen, side="right") - 1
+
+    values = np.asarray(values, dtype=np.float64)
+    aligned = np.full(len(indices), np.nan)
+    aligned[indices >= 0] = values[indices[indices >= 0]]
+    return aligned
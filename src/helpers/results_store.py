@@ -0,0 +1,329 @@
+from collections import defaultdict
+
+import datetime
+import glob
+import hashlib
+import inspect
+import json
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    from importlib.metadata import version as package_version
+except ImportError:
+    # Python versions before 3.8.
+    import pkg_resources
+
+    def package_version(name):
+        return pkg_resources.get_distribution(name).version
+
+
+ORDER_TYPES = ("sell", "buy")
+
+# The libraries whose versions can change the results of a backtest.
+LIBRARIES = ("numpy", "pandas", "finta")
+
+# The source of the backtester itself, the simulation, portfolio and helper modules.
+ENGINE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def source_hash(model_class):
+    """Hash the source of a model class and the classes it inherits from.
+
+    Args:
+        model_class: The model class.
+
+    Returns:
+        A hex digest that changes whenever the source file of the model, or of any of its bases, changes.
+    """
+    digest = hashlib.sha1()
+    for cls in model_class.__mro__:
+        try:
+            path = inspect.getsourcefile(cls)
+        except TypeError:
+            # Built in classes such as object have no source.
+            continue
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def engine_hash():
+    """Hash the source of the backtester, every module under src/ that a run's results could depend on.
+
+    Returns:
+        A hex digest that changes whenever any of the modules change.
+    """
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(ENGINE_DIRECTORY, "**", "*.py"), recursive=True)):
+        digest.update(os.path.relpath(path, ENGINE_DIRECTORY).replace(os.sep, "/").encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def library_versions():
+    """Get the installed versions of the libraries a run's results depend on.
+
+    Returns:
+        A dictionary keyed on library name, of its version, or None if it isn't installed.
+    """
+    versions = {}
+    for name in LIBRARIES:
+        try:
+            versions[name] = package_version(name)
+        except Exception:
+            versions[name] = None
+    return versions
+
+
+def data_fingerprint(model):
+    """Fingerprint the data files a model reads, and the window of them it uses.
+
+    Only the sizes and modification times of the files are used, so nothing needs to be read.
+
+    Args:
+        model: The model, with its data files found.
+
+    Returns:
+        A JSON serialisable description of the data.
+    """
+    files = []
+    for symbol, path in sorted(model.symbol_files.items()):
+        stat = os.stat(path)
+        files.append([symbol, stat.st_size, stat.st_mtime_ns])
+    return {
+        "files": files,
+        "start_time": model.start_time,
+        "end_time": model.end_time,
+        "interval": model.interval,
+        "columns": list(model.columns),
+        "compact": model.compact
+    }
+
+
+class StoredRun(object):
+    """The results of a backtest, read back from a ResultsStore.
+
+    Attributes:
+        key: The run's key.
+        metadata: The model, parameters, data and summary the run was stored with.
+        orders: A DataFrame of the orders, with the columns symbol, type, price and time.
+        balances: A dictionary keyed on symbol, of the final balance of each symbol's simulation.
+        ticks: The sorted ticks used across the simulation.
+        timestamps: The times of the equity curve, or None if the run didn't produce one.
+        value_points: The value of the portfolio at each of the timestamps, or None.
+    """
+
+    def __init__(self, key, metadata, arrays):
+        self.key = key
+        self.metadata = metadata
+
+        symbols = arrays["symbols"]
+        self.orders = pd.DataFrame({
+            "symbol": symbols[arrays["order_symbols"]],
+            "type": np.array(ORDER_TYPES)[arrays["order_types"]],
+            "price": arrays["order_prices"],
+            "time": arrays["order_times"]
+        }, columns=["symbol", "type", "price", "time"])
+        self.balances = dict(zip(symbols.tolist(), arrays["balances"].tolist()))
+        self.ticks = arrays["ticks"]
+        self.timestamps = arrays["timestamps"] if "timestamps" in arrays else None
+        self.value_points = arrays["value_points"] if "value_points" in arrays else None
+
+    def order_list(self):
+        """Rebuild the orders in the format logged by AlphaPrototype.
+
+        Returns:
+            A dictionary keyed on symbol, of lists of order dictionaries.
+        """
+        orders = defaultdict(list)
+        for symbol, order_type, price, time in zip(*[self.orders[column].tolist() for column in self.orders]):
+            orders[symbol].append({"symbol": symbol, "type": order_type, "price": price, "time": time})
+        return orders
+
+
+class ResultsStore(object):
+    """Stores the orders, per-symbol results and equity curve of backtests on disk, keyed on the run.
+
+    Each run is an uncompressed .npz file of columns, named after a hash of the model's source, the
+    backtester's source and library versions, its parameters and a fingerprint of its data, with a .json
+    file of the same name describing the run so they can be compared. Every run writes only its own files,
+    so any number of processes can save runs to the same store at once.
+
+    Attributes:
+        directory: The directory the runs are stored in.
+    """
+
+    def __init__(self, directory="Results/"):
+        """Creates a store, without touching the disk until a run is saved.
+
+        Args:
+            directory: The directory to store runs in.
+        """
+        self.directory = directory
+
+    def describe(self, model):
+        """Describe everything about a model that its results depend on.
+
+        Args:
+            model: The model, with its data files found.
+
+        Returns:
+            A JSON serialisable dictionary.
+        """
+        return {
+            "model": "{}.{}".format(type(model).__module__, type(model).__name__),
+            "source": source_hash(type(model)),
+            "engine": engine_hash(),
+            "libraries": library_versions(),
+            "parameters": model.get_parameters(),
+            "settings": {
+                "starting_balance": model.starting_balance,
+                "slippage": model.slippage,
+                "fees": model.fees
+            },
+            "data": data_fingerprint(model)
+        }
+
+    def run_key(self, model):
+        """Get the key a model's results are stored under.
+
+        Args:
+            model: The model, with its data files found.
+
+        Returns:
+            A hex digest that changes whenever the model, the backtester, its libraries, the model's parameters
+            or its data change.
+        """
+        description = json.dumps(self.describe(model), sort_keys=True, default=str)
+        return hashlib.sha1(description.encode()).hexdigest()
+
+    def path(self, key):
+        """Gets the file a run is stored in."""
+        return os.path.join(self.directory, key + ".npz")
+
+    def metadata_path(self, key):
+        """Gets the file describing a run."""
+        return os.path.join(self.directory, key + ".json")
+
+    def read_metadata(self, key):
+        """Read the description of a stored run.
+
+        Args:
+            key: The run's key.
+
+        Returns:
+            The model, parameters, data and summary the run was stored with, or an empty dictionary.
+        """
+        if not os.path.exists(self.metadata_path(key)):
+            return {}
+        with open(self.metadata_path(key)) as f:
+            return json.load(f)
+
+    def read_index(self):
+        """Read the description of every stored run.
+
+        Returns:
+            A dictionary keyed on run key.
+        """
+        index = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+            key = os.path.splitext(os.path.basename(path))[0]
+            index[key] = self.read_metadata(key)
+        return index
+
+    def save(self, key, model, balances, result=None):
+        """Store the results of a backtest.
+
+        Args:
+            key: The run's key, from run_key.
+            model: The model, after run_backtest.
+            balances: A dictionary keyed on symbol, of the final balance of each symbol's simulation.
+            result: An optional PortfolioResult for the run's equity curve.
+        """
+        symbols = list(balances)
+        columns = {symbol: i for i, symbol in enumerate(symbols)}
+        orders = [order for symbol in symbols for order in model.orders.get(symbol, [])]
+
+        arrays = {
+            "symbols": np.array(symbols, dtype=str),
+            "balances": np.array([balances[symbol] for symbol in symbols], dtype=np.float64),
+            "order_symbols": np.array([columns[order["symbol"]] for order in orders], dtype=np.int32),
+            "order_types": np.array([order["type"] == "buy" for order in orders], dtype=np.int8),
+            "order_prices": np.array([order["price"] for order in orders], dtype=np.float64),
+            "order_times": np.array([order["time"] for order in orders], dtype=np.float64),
+            "ticks": np.sort(np.fromiter(model.all_ticks, dtype=np.float64, count=len(model.all_ticks)))
+        }
+        summary = {
+            "profit": float(sum(balances.values()) - model.starting_balance * len(balances)),
+            "orders": len(orders)
+        }
+        if result is not None:
+            arrays["timestamps"] = np.asarray(result.timestamps, dtype=np.float64)
+            arrays["value_points"] = np.asarray(result.value_points, dtype=np.float64)
+            summary.update(result.summary)
+
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = "{}.{}.tmp".format(self.path(key), os.getpid())
+        with open(temp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, self.path(key))
+
+        metadata = self.describe(model)
+        metadata["created"] = datetime.datetime.utcnow().isoformat()
+        metadata["summary"] = summary
+
+        temp_path = "{}.{}.tmp".format(self.metadata_path(key), os.getpid())
+        with open(temp_path, "w") as f:
+            json.dump(metadata, f, indent=2, sort_keys=True, default=str)
+        os.replace(temp_path, self.metadata_path(key))
+
+    def load(self, key):
+        """Read a stored run.
+
+        Args:
+            key: The run's key.
+
+        Returns:
+            The StoredRun, or None if there is no run stored under the key.
+        """
+        if not os.path.exists(self.path(key)):
+            return None
+
+        with np.load(self.path(key)) as arrays:
+            return StoredRun(key, self.read_metadata(key), {name: arrays[name] for name in arrays.files})
+
+    def runs(self):
+        """List every stored run, for comparing them.
+
+        Returns:
+            A DataFrame indexed on run key, with the model, creation time, parameters and summary of each run.
+        """
+        rows = []
+        for key, metadata in self.read_index().items():
+            row = {"key": key, "model": metadata["model"], "created": metadata["created"]}
+            row.update(metadata["parameters"])
+            row.update(metadata["summary"])
+            rows.append(row)
+        if not rows:
+            return pd.DataFrame(columns=["model", "created"])
+        return pd.DataFrame(rows).set_index("key").sort_values("created")
+
+    def equity_curves(self, keys):
+        """Line up the equity curves of several runs on one time index.
+
+        Args:
+            keys: The keys of the runs.
+
+        Returns:
+            A DataFrame indexed on time with a column per run, forward filled where a run has no value.
+        """
+        curves = {}
+        for key in keys:
+            run = self.load(key)
+            if run is not None and run.timestamps is not None:
+                curves[key] = pd.Series(run.value_points, index=run.timestamps)
+        return pd.DataFrame(curves).sort_index().ffill()
@@ -0,0 +1,376 @@
+"""
+    Incremental versions of the finta indicators used by the models, which take one candle at a time.
+    Each update is O(1) in the length of the history, and the values match finta's batch output.
+"""
+
+from collections import deque
+
+import math
+
+
+def _divide(numerator, denominator):
+    """Divide two floats the way pandas does, giving inf or nan instead of raising on zero."""
+    if denominator == 0:
+        if numerator == 0 or numerator != numerator:
+            return math.nan
+        return math.copysign(math.inf, numerator) * math.copysign(1, denominator)
+    return numerator / denominator
+
+
+class EWM(object):
+    """An exponentially weighted mean, equivalent to pandas' ewm(adjust=True, ignore_na=False).mean().
+
+    Attributes:
+        value: The latest mean, nan until min_periods observations have been seen.
+    """
+
+    def __init__(self, span=None, alpha=None, min_periods=0):
+        """Creates the mean.
+
+        Args:
+            span: The decay as a span, as in pandas.
+            alpha: The decay as a smoothing factor, as in pandas.
+            min_periods: How many observations are needed before there is a value.
+        """
+        # Derive alpha through the centre of mass the same way pandas does, so rounding matches.
+        if span is not None:
+            com = (span - 1) / 2.0
+        else:
+            com = (1 - alpha) / alpha
+        self.alpha = 1.0 / (1.0 + com)
+        self.min_periods = max(min_periods, 1)
+
+        self.weighted = None
+        self.old_weight = 1.0
+        self.observations = 0
+        self.value = math.nan
+
+    def update(self, x):
+        """Adds an observation, which may be nan.
+
+        Args:
+            x: The next value in the series.
+
+        Returns:
+            The mean after the observation.
+        """
+        is_observation = x == x
+        self.observations += is_observation
+
+        if self.weighted is None:
+            self.weighted = x
+        elif self.weighted == self.weighted:
+            self.old_weight *= 1 - self.alpha
+            if is_observation:
+                if self.weighted != x:
+                    self.weighted = (self.old_weight * self.weighted + x) / (self.old_weight + 1.0)
+                self.old_weight += 1.0
+        elif is_observation:
+            self.weighted = x
+
+        self.value = self.weighted if self.observations >= self.min_periods else math.nan
+        return self.value
+
+
+class RollingMean(object):
+    """A rolling mean, equivalent to pandas' rolling(window, min_periods).mean().
+
+    Attributes:
+        value: The latest mean, nan until min_periods observations are in the window.
+    """
+
+    def __init__(self, window, min_periods=None):
+        """Creates the mean.
+
+        Args:
+            window: How many values are in the window.
+            min_periods: How many non-nan values are needed in the window for there to be a value.
+        """
+        self.window = window
+        self.min_periods = window if min_periods is None else min_periods
+        self.values = deque()
+        self.total = 0.0
+        self.compensation = 0.0
+        self.observations = 0
+        self.value = math.nan
+
+    def add(self, x, sign):
+        """Adds or removes a value from the compensated running total."""
+        if x != x:
+            return
+        self.observations += sign
+        y = sign * x - self.compensation
+        t = self.total + y
+        self.compensation = t - self.total - y
+        self.total = t
+
+    def update(self, x):
+        """Adds the next value to the window.
+
+        Args:
+            x: The next value in the series.
+
+        Returns:
+            The mean of the window.
+        """
+        self.values.append(x)
+        self.add(x, 1)
+        if len(self.values) > self.window:
+            self.add(self.values.popleft(), -1)
+
+        if self.observations >= max(self.min_periods, 1):
+            self.value = self.total / self.observations
+        else:
+            self.value = math.nan
+        return self.value
+
+
+class RollingStd(object):
+    """A rolling standard deviation, equivalent to pandas' rolling(window).std(ddof).
+
+    Attributes:
+        value: The latest standard deviation, nan until the window is full.
+    """
+
+    def __init__(self, window, ddof=1):
+        """Creates the standard deviation.
+
+        Args:
+            window: How many values are in the window.
+            ddof: The delta degrees of freedom.
+        """
+        self.window = window
+        self.ddof = ddof
+        self.values = deque()
+        self.observations = 0
+        self.mean = 0.0
+        self.ssqdm = 0.0
+        self.value = math.nan
+
+    def update(self, x):
+        """Adds the next value to the window.
+
+        Args:
+            x: The next value in the series.
+
+        Returns:
+            The standard deviation of the window.
+        """
+        self.values.append(x)
+        if x == x:
+            # Welford's update, as used by pandas.
+            self.observations += 1
+            delta = x - self.mean
+            self.mean += delta / self.observations
+            self.ssqdm += ((self.observations - 1) * delta ** 2) / self.observations
+
+        if len(self.values) > self.window:
+            removed = self.values.popleft()
+            if removed == removed:
+                self.observations -= 1
+                if self.observations:
+                    delta = removed - self.mean
+                    self.mean -= delta / self.observations
+                    self.ssqdm -= ((self.observations + 1) * delta ** 2) / self.observations
+                else:
+                    self.mean = 0.0
+                    self.ssqdm = 0.0
+
+        if self.observations >= self.window and self.observations > self.ddof:
+            self.value = math.sqrt(max(self.ssqdm / (self.observations - self.ddof), 0.0))
+        else:
+            self.value = math.nan
+        return self.value
+
+
+class EMA(object):
+    """Incremental TA.EMA.
+
+    Attributes:
+        value: The latest EMA.
+    """
+
+    def __init__(self, period=9, column="close"):
+        """Creates the indicator.
+
+        Args:
+            period: The span of the moving average.
+            column: The candle column to average.
+        """
+        self.column = column
+        self.mean = EWM(span=period, min_periods=period - 1)
+        self.value = math.nan
+
+    def update(self, bar):
+        """Adds the next candle.
+
+        Args:
+            bar: A dictionary of the candle's OHLCV values.
+
+        Returns:
+            The indicator value for the candle.
+        """
+        self.value = self.mean.update(bar[self.column])
+        return self.value
+
+
+class RSI(object):
+    """Incremental TA.RSI.
+
+    Attributes:
+        value: The latest RSI.
+    """
+
+    def __init__(self, period=14):
+        """Creates the indicator.
+
+        Args:
+            period: The span used to smooth gains and losses.
+        """
+        self.gain = EWM(span=period, min_periods=period - 1)
+        self.loss = EWM(span=period, min_periods=period - 1)
+        self.last_close = math.nan
+        self.value = math.nan
+
+    def update(self, bar):
+        """Adds the next candle.
+
+        Args:
+            bar: A dictionary of the candle's OHLCV values.
+
+        Returns:
+            The indicator value for the candle.
+        """
+        delta = bar["close"] - self.last_close
+        self.last_close = bar["close"]
+
+        # nan on the first candle, as with diff().
+        up = delta if not delta < 0 else 0.0
+        down = abs(delta) if not delta > 0 else 0.0
+
+        rs = _divide(self.gain.update(up), self.loss.update(down))
+        self.value = 100 - _divide(100, 1 + rs)
+        return self.value
+
+
+class ATR(object):
+    """Incremental TA.ATR.
+
+    Attributes:
+        value: The latest ATR.
+    """
+
+    def __init__(self, period=14):
+        """Creates the indicator.
+
+        Args:
+            period: The window of the moving average of true range.
+        """
+        self.mean = RollingMean(period, period - 1)
+        self.last_close = math.nan
+        self.value = math.nan
+
+    def update(self, bar):
+        """Adds the next candle.
+
+        Args:
+            bar: A dictionary of the candle's OHLCV values.
+
+        Returns:
+            The indicator value for the candle.
+        """
+        ranges = [abs(bar["high"] - bar["low"]),
+                  abs(bar["high"] - self.last_close),
+                  abs(self.last_close - bar["low"])]
+        valid_ranges = [r for r in ranges if r == r]
+        true_range = max(valid_ranges) if valid_ranges else math.nan
+        self.last_close = bar["close"]
+
+        self.value = self.mean.update(true_range)
+        return self.value
+
+
+class ADX(object):
+    """Incremental TA.ADX, including finta's DMI.
+
+    Attributes:
+        value: The latest ADX.
+    """
+
+    def __init__(self, period=14):
+        """Creates the indicator.
+
+        Args:
+            period: The period of the directional movement index.
+        """
+        self.atr = ATR(period * 6)
+        self.plus = EWM(span=period, min_periods=period - 1)
+        self.minus = EWM(span=period, min_periods=period - 1)
+        self.mean = EWM(alpha=1 / period)
+        self.last_high = math.nan
+        self.last_low = math.nan
+        self.value = math.nan
+
+    def update(self, bar):
+        """Adds the next candle.
+
+        Args:
+            bar: A dictionary of the candle's OHLCV values.
+
+        Returns:
+            The indicator value for the candle.
+        """
+        up_move = bar["high"] - self.last_high
+        down_move = bar["low"] - self.last_low
+        self.last_high = bar["high"]
+        self.last_low = bar["low"]
+
+        dm_plus = up_move if up_move > down_move and up_move > 0 else 0
+        dm_minus = down_move if down_move > up_move and down_move > 0 else 0
+
+        atr = self.atr.update(bar)
+        di_plus = 100 * self.plus.update(_divide(dm_plus, atr))
+        di_minus = 100 * self.minus.update(_divide(dm_minus, atr))
+
+        self.value = 100 * self.mean.update(_divide(abs(di_plus - di_minus), di_plus + di_minus))
+        return self.value
+
+
+class BBANDS(object):
+    """Incremental TA.BBANDS.
+
+    Attributes:
+        value: The latest bands, a dictionary keyed on BB_UPPER, BB_MIDDLE and BB_LOWER, or one band.
+    """
+
+    def __init__(self, period=20, band=None):
+        """Creates the indicator.
+
+        Args:
+            period: The window of the moving average and standard deviation.
+            band: BB_UPPER, BB_MIDDLE or BB_LOWER to only return that band, or None for all of them.
+        """
+        self.band = band
+        self.middle = RollingMean(period, period - 1)
+        self.std = RollingStd(period)
+        self.value = math.nan
+
+    def update(self, bar):
+        """Adds the next candle.
+
+        Args:
+            bar: A dictionary of the candle's OHLCV values.
+
+        Returns:
+            The indicator value for the candle.
+        """
+        middle = self.middle.update(bar["close"])
+        std = self.std.update(bar["close"])
+        bands = {
+            "BB_UPPER": middle + 2 * std,
+            "BB_MIDDLE": middle,
+            "BB_LOWER": middle - 2 * std
+        }
+
+        self.value = bands if self.band is None else bands[self.band]
+        return self.value
@@ -0,0 +1,61 @@
+from src.helpers.get_historical import interval_to_milliseconds
+
+import numpy as np
+
+
+def to_milliseconds(length):
+    """Convert a window length to milliseconds.
+
+    Args:
+        length: A number of milliseconds, or a binance style interval string, eg. 30d or 12w.
+
+    Returns:
+        The length in milliseconds.
+    """
+    if isinstance(length, str):
+        milliseconds = interval_to_milliseconds(length)
+        if milliseconds is None:
+            raise ValueError("unknown window length {}".format(length))
+        return milliseconds
+    return int(length)
+
+
+def walk_forward_windows(first_time, last_time, train, test, step=None):
+    """Split a span of time into consecutive train and test windows.
+
+    Each window trains on the train length before its test window, and the windows move forward by the
+    step, until a test window would start after the last candle.
+
+    Args:
+        first_time: The open time of the first candle, in milliseconds.
+        last_time: The open time of the last candle, in milliseconds.
+        train: The length of each train window, in milliseconds or as an interval string.
+        test: The length of each test window, in milliseconds or as an interval string.
+        step: How far to move each window on from the last, or None to move on by the test length.
+
+    Returns:
+        An int64 array of shape (windows, 3), of the train start, test start and test end of each window,
+        with the starts included and the end excluded.
+    """
+    train = to_milliseconds(train)
+    test = to_milliseconds(test)
+    step = test if step is None else to_milliseconds(step)
+    if train < 0 or test <= 0 or step <= 0:
+        raise ValueError("the test length and step must be positive, and the train length not negative")
+
+    train_starts = np.arange(int(first_time), int(last_time) - train + 1, step, dtype=np.int64)
+    return np.stack([train_starts, train_starts + train, train_starts + train + test], axis=1).reshape(-1, 3)
+
+
+def window_rows(times, windows):
+    """Find the rows of a symbol's sorted candles that fall within each window, with a binary search.
+
+    Args:
+        times: The sorted open times of the symbol's candles.
+        windows: The windows, from walk_forward_windows.
+
+    Returns:
+        An array of the same shape as windows, of the first train row, first test row and the row after
+        the last test row of each window.
+    """
+    return np.searchsorted(times, windows, side="left")
@@ -0,0 +1,155 @@
+"""
+    Runs several models over one shared copy of a data set, and reports their results in one table. Run
+    from the root of the repository with:
+
+        python -m src.run_models Test --models rsi_adx bband_adx --workers 3
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from src.base.alphaprototype import AlphaPrototype
+from src.run_order_history import PortfolioResult, deferred_plots, plot_order_history
+
+import argparse
+import contextlib
+import importlib
+import inspect
+import io
+import os
+import time
+import pandas as pd
+
+
+def discover_models(directory="models"):
+    """Find the model classes under a directory, without running any of them.
+
+    Args:
+        directory: The directory to search, relative to the root of the repository.
+
+    Returns:
+        An ordered dictionary of model classes, keyed on module.Class, eg. rsi_adx.RSI_ADX.
+    """
+    models = OrderedDict()
+    for root, directories, files in os.walk(directory):
+        directories.sort()
+        for file in sorted(files):
+            if not file.endswith(".py"):
+                continue
+
+            module_name = os.path.splitext(os.path.join(root, file))[0].replace(os.sep, ".")
+            module = importlib.import_module(module_name)
+            for name, cls in inspect.getmembers(module, inspect.isclass):
+                if issubclass(cls, AlphaPrototype) and cls.__module__ == module.__name__ \
+                        and not inspect.isabstract(cls):
+                    models["{}.{}".format(module_name.split(".")[-1], name)] = cls
+    return models
+
+
+def select_models(models, names):
+    """Pick models out by name.
+
+    Args:
+        models: The models from discover_models.
+        names: A list of module.Class or module names, or None for every model.
+
+    Returns:
+        An ordered dictionary of the selected model classes.
+    """
+    if not names:
+        return models
+
+    selected = OrderedDict()
+    for name in names:
+        matches = [key for key in models if key == name or key.split(".")[0] == name]
+        if not matches:
+            raise ValueError("no model called {}, choose from {}".format(name, ", ".join(models)))
+        for key in matches:
+            selected[key] = models[key]
+    return selected
+
+
+def run_models(models, data_source, starting_balance, workers=1, vectorized=True, **kwargs):
+    """Backtest several models over a data set that is only read once.
+
+    The first model reads the data, and every other model is given the same symbol_data. As the models
+    share the process, they also share the default indicator cache, so an indicator used by several
+    models is only calculated once per symbol. The models' charts are drawn on the main thread once every
+    model has finished.
+
+    Args:
+        models: An ordered dictionary of model classes keyed on name.
+        data_source: Which data folder to import from.
+        starting_balance: What balance each simulation should start with.
+        workers: How many models to run at once, in threads.
+        vectorized: Whether to use the signals hook when a model provides it, rather than step().
+        **kwargs: Any other arguments for the models' constructors, eg. data_root or whitelist.
+
+    Returns:
+        A DataFrame with a row per model, of how long it took, its orders and profit, and the summary of
+        its portfolio simulation when print_full_results returns one.
+    """
+    names = list(models)
+    start = time.perf_counter()
+    first = models[names[0]](data_source, starting_balance, **kwargs)
+    first.symbol_data.load_all()
+    print ("loaded {} symbols in {:.2f}s".format(len(first.symbol_data), time.perf_counter() - start))
+
+    instances = [first] + [models[name](data_source, starting_balance, symbol_data=first.symbol_data, **kwargs)
+                           for name in names[1:]]
+
+    def run(model):
+        start = time.perf_counter()
+        result = model.run_backtest(vectorized=vectorized)
+        return time.perf_counter() - start, result
+
+    with deferred_plots() as plots:
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                outcomes = list(executor.map(run, instances))
+        else:
+            outcomes = [run(model) for model in instances]
+
+    for result, output_path in plots:
+        plot_order_history(result, output_path)
+
+    rows = []
+    for name, model, (seconds, result) in zip(names, instances, outcomes):
+        row = OrderedDict([
+            ("model", name),
+            ("seconds", seconds),
+            ("orders", sum(len(orders) for orders in model.orders.values())),
+            ("profit", sum(model.balances.values()) - starting_balance * len(model.balances))
+        ])
+        if isinstance(result, PortfolioResult):
+            row.update(result.summary)
+        rows.append(row)
+
+    return pd.DataFrame(rows).set_index("model")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest several models over one shared data set.")
+    parser.add_argument("data_source", help="The data folder to test on, eg. Test.")
+    parser.add_argument("--data-root", default="Data/", help="The folder holding the data source.")
+    parser.add_argument("--models", nargs="*", help="The models to run, eg. rsi_adx or rsi_adx.RSI_ADX, "
+                                                    "every model by default.")
+    parser.add_argument("--starting-balance", type=float, default=100, help="The balance for each simulation.")
+    parser.add_argument("--workers", type=int, default=1, help="How many models to run at once.")
+    parser.add_argument("--step", action="store_true", help="Always use step() rather than signals.")
+    parser.add_argument("--quiet", action="store_true", help="Hide the output of the models themselves.")
+    args = parser.parse_args()
+
+    models = select_models(discover_models(), args.models)
+    if args.quiet:
+        with contextlib.redirect_stdout(io.StringIO()):
+            table = run_models(models, args.data_source, args.starting_balance, args.workers, not args.step,
+                               data_root=args.data_root)
+    else:
+        table = run_models(models, args.data_source, args.starting_balance, args.workers, not args.step,
+                           data_root=args.data_root)
+
+    print (table.to_string())
+
+
+if __name__ == "__main__":
+    main()
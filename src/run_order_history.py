@@ -1,68 +1,145 @@
-from collections import defaultdict
-from pandas.plotting import register_matplotlib_converters
-register_matplotlib_converters()
+from src.helpers.profiling import null_profiler
 
+import contextlib
 import datetime
-import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
 
 
-def run_order_history(order_list, ticks, data, output_path, chunks=20, starting_balance=1000, slippage=0.001, fees=0.00075):
+# The charts requested while deferred_plots is active, which are drawn later rather than straight away.
+_deferred_plots = None
+
+
+class PortfolioResult(object):
+    """The outcome of a portfolio simulation.
+
+    Attributes:
+        timestamps: The sorted tick times, in milliseconds.
+        value_points: The total value of the account at each tick.
+        trades: The orders that were carried out, with the tokens and amount of the balance involved.
+        summary: A dictionary of summary statistics for the simulation.
+    """
+
+    def __init__(self, timestamps, value_points, trades, summary):
+        self.timestamps = timestamps
+        self.value_points = value_points
+        self.trades = trades
+        self.summary = summary
+
+
+def summarise(value_points, starting_balance, trades, skipped_orders):
+    """Calculate the summary statistics for a simulation.
+
+    Args:
+        value_points: The total value of the account at each tick.
+        starting_balance: The starting balance of the account.
+        trades: The orders that were carried out.
+        skipped_orders: How many orders could not be carried out.
+
+    Returns:
+        A dictionary of summary statistics.
+    """
+    if not len(value_points):
+        value_points = np.array([starting_balance], dtype=np.float64)
+    peaks = np.maximum.accumulate(value_points)
+    final_value = value_points[-1]
+
+    return {
+        "starting_balance": starting_balance,
+        "final_value": float(final_value),
+        "return": float(final_value / starting_balance - 1),
+        "peak_value": float(peaks[-1]),
+        "max_drawdown": float((1 - value_points / peaks).max()),
+        "trades": len(trades),
+        "skipped_orders": skipped_orders
+    }
+
+
+def align_prices(ticks, data):
+    """Align the close prices of every symbol on a shared time index.
+
+    Args:
+        ticks: All of the ticks iterated over during the simulation.
+        data: The symbol data from the simulation.
+
+    Returns:
+        The sorted tick times, the symbols, and a ticks x symbols matrix of close prices. Each price is
+        carried forward over the ticks a symbol has no candle for, and is 0 before its first candle.
+    """
+    tick_times = np.sort(np.fromiter(ticks, dtype=np.float64, count=len(ticks)))
+    symbols = list(data)
+
+    prices = np.full((len(tick_times), len(symbols)), np.nan)
+    for column, points in enumerate(data.values()):
+        rows = np.searchsorted(tick_times, points["time"].values)
+        prices[rows, column] = points["close"].values
+
+    # Forward fill each column with the row index of the last price seen.
+    last_seen = np.where(np.isnan(prices), 0, np.arange(len(tick_times))[:, None])
+    np.maximum.accumulate(last_seen, axis=0, out=last_seen)
+    prices = prices[last_seen, np.arange(len(symbols))]
+
+    return tick_times, symbols, np.nan_to_num(prices)
+
+
+def run_order_history(order_list, ticks, data, output_path=None, chunks=20, starting_balance=1000, slippage=0.001, fees=0.00075,
+                      profiler=None):
     """Run a full simulation applying asset management against the simulated orders.
 
     Args:
         order_list: The orders logged during the simulation.
         ticks: All of the ticks iterated over during the simulation.
         data: The symbol data from the simulation.
-        output_path: The location to store the results.
+        output_path: The location to store a chart of the results, or None to skip charting.
         chunks: How many pieces to split our total assets into.
         starting_balance: The starting balance to use for this operation.
         slippage: How much slippage to apply to orders, 0.001 for 1%.
         fees: How much to remove for fees, 0.001% for 1%.
+        profiler: An optional Profiler to record the time spent aligning, replaying and charting.
+
+    Returns:
+        A PortfolioResult holding the value of the account at each tick, the trades and a summary.
     """
 
     fees = 1 - fees
     slippage_down = 1 - slippage
     slippage_up = 1 + slippage
 
-    # Get the historical data used in the test and reformat for efficient use.
-    stacked_sequence = {}
-    prices = {}
-    for tick in ticks:
-        stacked_sequence[tick] = []
-        prices[tick] = {}
-
-    for symbol, points in data.items():
-        for i in range(len(points["close"])):
-            close = points["close"][i]
-            time = points["time"][i]
-            prices[time][symbol] = close
-
-
-    for symbol, orders in order_list.items():
-        for order in orders:
-            time = order["time"]
-            stacked_sequence[time].append(order)
+    if profiler is None:
+        profiler = null_profiler
 
-    tick_times = list(ticks)
-    tick_times = sorted(tick_times)
+    # Get the historical data used in the test as a ticks x symbols matrix of prices.
+    with profiler.phase("run_order_history.align"):
+        tick_times, symbols, prices = align_prices(ticks, data)
+    columns = {symbol: i for i, symbol in enumerate(symbols)}
 
+    # Stack the orders by tick, keeping the order they were logged in within a tick.
+    sequence = [order for orders in order_list.values() for order in orders]
+    order_rows = np.searchsorted(tick_times, [order["time"] for order in sequence])
+    ordering = np.argsort(order_rows, kind="stable")
 
     balance = starting_balance
-    value_points = []
+    value_points = np.empty(len(tick_times))
     active_positions = {}
+    positions = np.zeros(len(symbols))
+    trades = []
+    skipped_orders = 0
 
-    # Store whatever the last price we saw was, accounts for gaps in prices.
-    live_price = defaultdict(float)
+    def value_range(start, end):
+        # Value every tick between order ticks as the cash balance plus the held tokens at the live prices.
+        held = np.flatnonzero(positions)
+        value_points[start:end] = balance + prices[start:end, held].dot(positions[held])
 
-    # Iterate through the test timespan and operate the account.
-    for tick in tick_times:
-        p = prices[tick]
+    with profiler.phase("run_order_history.replay"):
+        # Operate the account, only stopping at the ticks with orders.
+        start = 0
+        for index in ordering:
+            order = sequence[index]
+            row = order_rows[index]
+            if row != start:
+                value_range(start, row)
+                start = row
 
-        for symbol,  v in p.items():
-            live_price[symbol] = v
-        orders = stacked_sequence[tick]
-
-        for order in orders:
             if order["type"] == "buy":
                 if len(active_positions) < chunks:
                     # How much can we allocate, account for fees and slippage?
@@ -70,33 +147,212 @@ def run_order_history(order_list, ticks, data, output_path, chunks=20, starting_
                     balance -= chunk_size
                     tokens = (chunk_size * fees) / (order["price"] * slippage_up)
                     active_positions[order["symbol"]] = tokens
+                    positions[columns[order["symbol"]]] = tokens
+                    trades.append(dict(order, tokens=tokens, amount=-chunk_size))
                 else:
                     # We've allocated all of our funds at this point.
-                    pass
+                    skipped_orders += 1
             else:
                 if order["symbol"] not in active_positions:
+                    skipped_orders += 1
                     continue
                 # Make the sale and account for fees and slippage.
                 tokens = active_positions[order["symbol"]]
                 del active_positions[order["symbol"]]
+                positions[columns[order["symbol"]]] = 0
                 return_chunk = (tokens * (order["price"] * slippage_down) * fees)
                 balance += return_chunk
+                trades.append(dict(order, tokens=tokens, amount=return_chunk))
+        value_range(start, len(tick_times))
+
+    summary = summarise(value_points, starting_balance, trades, skipped_orders)
+    result = PortfolioResult(tick_times, value_points, trades, summary)
+    if output_path is not None:
+        with profiler.phase("run_order_history.plot"):
+            plot_order_history(result, output_path)
+
+    return result
+
+
+def sample_scenarios(count, fees=(0.0005, 0.002), slippage=(0.0, 0.005), chunks=(10, 30), drop_rate=(0.0, 0.1),
+                     seed=0):
+    """Sample cost and allocation scenarios for run_order_scenarios, uniformly between bounds.
+
+    Args:
+        count: How many scenarios to sample.
+        fees: The (low, high) bounds of the fees, or a single value to use for every scenario.
+        slippage: The (low, high) bounds of the slippage, or a single value.
+        chunks: The (low, high) bounds of the number of chunks, inclusive, or a single value.
+        drop_rate: The (low, high) bounds of the chance of each order being dropped, or a single value.
+        seed: The random seed, the same seed always gives the same scenarios.
+
+    Returns:
+        A dictionary of arrays keyed on setting, which can be passed to run_order_scenarios as keywords.
+    """
+    random = np.random.RandomState(seed)
 
-        # Calculate the current total value.
-        total_value = balance
-        for key, value in active_positions.items():
-            try:
-                total_value += live_price[key] * value
-            except:
-                print ("There might be an issue with the data.")
-        value_points.append(total_value)
+    def sample(bounds, integer=False):
+        if np.isscalar(bounds):
+            return np.full(count, bounds)
+        low, high = bounds
+        return random.randint(low, high + 1, count) if integer else random.uniform(low, high, count)
+
+    return {
+        "fees": sample(fees),
+        "slippage": sample(slippage),
+        "chunks": sample(chunks, integer=True),
+        "drop_rate": sample(drop_rate)
+    }
+
+
+def run_order_scenarios(order_list, ticks, data, fees=0.00075, slippage=0.001, chunks=20, drop_rate=0.0,
+                        starting_balance=1000, seed=0, block_size=4096):
+    """Replay the orders from a simulation under many fee, slippage, chunk and dropped order scenarios at once.
+
+    Each setting is either a single value or an array with one value per scenario. Every scenario is stepped
+    through the orders together, as rows of arrays, and the account is valued one block of ticks at a time
+    with the drawdown tracked as it goes, so the cost is close to a single run_order_history.
+
+    Args:
+        order_list: The orders logged during the simulation.
+        ticks: All of the ticks iterated over during the simulation.
+        data: The symbol data from the simulation.
+        fees: How much to remove for fees, 0.001% for 1%.
+        slippage: How much slippage to apply to orders, 0.001 for 1%.
+        chunks: How many pieces to split our total assets into.
+        drop_rate: The chance of each order being dropped, eg. because it wouldn't have been filled.
+        starting_balance: The starting balance to use for every scenario.
+        seed: The random seed for choosing which orders are dropped.
+        block_size: How many ticks to value at once, which bounds the memory used to scenarios x block_size.
+
+    Returns:
+        A DataFrame with a row per scenario, of its settings, final value, return, maximum drawdown, and how
+        many trades were made and orders skipped.
+    """
+    fees, slippage, chunks, drop_rate = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(setting, dtype=np.float64)) for setting in (fees, slippage, chunks, drop_rate)])
+    scenarios = len(fees)
+    fees_kept = 1 - fees
+    slippage_down = 1 - slippage
+    slippage_up = 1 + slippage
+
+    tick_times, symbols, prices = align_prices(ticks, data)
+    columns = {symbol: i for i, symbol in enumerate(symbols)}
+
+    sequence = [order for orders in order_list.values() for order in orders]
+    order_rows = np.searchsorted(tick_times, [order["time"] for order in sequence])
+    ordering = np.argsort(order_rows, kind="stable")
+    kept = np.random.RandomState(seed).random_sample((scenarios, len(sequence))) >= drop_rate[:, None]
+
+    balance = np.full(scenarios, float(starting_balance))
+    positions = np.zeros((scenarios, len(symbols)))
+    held_count = np.zeros(scenarios, dtype=np.int64)
+    trades = np.zeros(scenarios, dtype=np.int64)
+    skipped_orders = np.zeros(scenarios, dtype=np.int64)
+
+    final_values = balance.copy()
+    peaks = np.full(scenarios, -np.inf)
+    drawdowns = np.zeros(scenarios)
+
+    def value_range(start, end):
+        # Value every scenario over the ticks between orders, only using the symbols some scenario holds.
+        held = np.flatnonzero(positions.any(axis=0))
+        for block_start in range(start, end, block_size):
+            block_end = min(block_start + block_size, end)
+            values = balance[:, None] + positions[:, held].dot(prices[block_start:block_end, held].T)
+
+            block_peaks = np.maximum(peaks[:, None], np.maximum.accumulate(values, axis=1))
+            np.maximum(drawdowns, (1 - values / block_peaks).max(axis=1), out=drawdowns)
+            peaks[:] = block_peaks[:, -1]
+            final_values[:] = values[:, -1]
+
+    start = 0
+    for index in ordering:
+        order = sequence[index]
+        row = order_rows[index]
+        if row != start:
+            value_range(start, row)
+            start = row
+
+        active = kept[:, index]
+        column = columns[order["symbol"]]
+        held = positions[:, column] != 0
+        if order["type"] == "buy":
+            # A buy of a symbol that is already held, eg. after its sell was dropped, is skipped.
+            placed = active & ~held & (held_count < chunks)
+            chunk_size = np.where(placed, balance / np.maximum(chunks - held_count, 1), 0)
+            balance -= chunk_size
+            tokens = (chunk_size * fees_kept) / (order["price"] * slippage_up)
+            held_count += placed
+            positions[:, column] = np.where(placed, tokens, positions[:, column])
+        else:
+            placed = active & held
+            balance += np.where(placed, positions[:, column] * (order["price"] * slippage_down) * fees_kept, 0)
+            positions[placed, column] = 0
+            held_count -= placed
+        trades += placed
+        skipped_orders += active & ~placed
+    value_range(start, len(tick_times))
+
+    return pd.DataFrame({
+        "fees": fees,
+        "slippage": slippage,
+        "chunks": chunks.astype(np.int64),
+        "drop_rate": drop_rate,
+        "final_value": final_values,
+        "return": final_values / starting_balance - 1,
+        "max_drawdown": drawdowns,
+        "trades": trades,
+        "skipped_orders": skipped_orders
+    }, columns=["fees", "slippage", "chunks", "drop_rate", "final_value", "return", "max_drawdown", "trades",
+                "skipped_orders"])
+
+
+@contextlib.contextmanager
+def deferred_plots():
+    """Collects the charts requested by plot_order_history inside a block, rather than drawing them.
+
+    pyplot is not thread safe, and interactive backends have to be used from the main thread, so
+    simulations run in worker threads should only chart their results once the threads have finished.
+
+    Yields:
+        A list that the result and output path of each chart requested is added to, to draw later with
+        plot_order_history from the main thread.
+    """
+    global _deferred_plots
+    plots = []
+    _deferred_plots = plots
+    try:
+        yield plots
+    finally:
+        _deferred_plots = None
+
+
+def plot_order_history(result, output_path):
+    """Chart the value of the account over a simulation.
+
+    matplotlib is only imported here, so simulations that aren't charted don't pay for it. Inside a
+    deferred_plots block, the chart is only recorded to be drawn later.
+
+    Args:
+        result: The PortfolioResult from run_order_history.
+        output_path: The location to store the chart, without the .png extension.
+    """
+    if _deferred_plots is not None:
+        _deferred_plots.append((result, output_path))
+        return
+
+    import matplotlib.pyplot as plt
+    from pandas.plotting import register_matplotlib_converters
+    register_matplotlib_converters()
 
     # Format the date data for charting.
     translated_dates = []
-    for k in tick_times:
+    for k in result.timestamps:
         t = datetime.datetime.utcfromtimestamp(int(k) / 1000)
         translated_dates.append(t)
-    plt.plot(translated_dates, value_points)
+
+    plt.plot(translated_dates, result.value_points)
 
     # Plot an output chart.
     plt.xlabel('time')
@@ -0,0 +1,167 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from src.helpers.lazy_data import LazySymbolData
+from src.helpers.metrics import metrics
+from src.run_order_history import run_order_history
+
+import itertools
+import pandas as pd
+
+
+# The candles and ticks read in each process, kept between the tasks it runs so each symbol is only read once.
+_process_data = {}
+
+def run_sweep(model_class, grid, data_source, starting_balance, workers=1, chunks=20, vectorized=True,
+              **kwargs):
+    """Backtest a model over every combination of a grid of parameters.
+
+    Each symbol's candles are read at most once in each process, and indicators are only calculated once per
+    symbol for each distinct combination of the model's indicator parameters, with the thresholds swept over
+    the same indicators.
+
+    Args:
+        model_class: The AlphaPrototype subclass to test.
+        grid: A dictionary keyed on parameter name, of the list of values to try for that parameter.
+        data_source: Which data folder to import from.
+        starting_balance: What balance each simulation should start with.
+        workers: How many processes to spread the work across, 1 runs everything in this process.
+        chunks: How many pieces to split the total assets into for the portfolio simulation.
+        vectorized: Whether to use the signals hook when a model provides it, rather than step().
+        **kwargs: Any other arguments for the model's constructor, eg. data_root or whitelist.
+
+    Returns:
+        A DataFrame with a row per combination of parameters, holding the parameter values, the profit
+        for each symbol, the total profit, the final portfolio value and the portfolio's metrics, eg. its
+        sharpe ratio and win rate, sorted from best to worst portfolio value.
+    """
+    model = model_class(data_source, starting_balance, **kwargs)
+
+    names = list(grid)
+    model.set_parameters({name: grid[name][0] for name in names})
+    combinations = [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+    # Group the combinations that share indicators, so each group only calculates them once per symbol.
+    indicator_names = [name for name in names if name in model.indicator_parameter_names]
+    groups = defaultdict(list)
+    for index, combination in enumerate(combinations):
+        groups[tuple(combination[name] for name in indicator_names)].append(index)
+
+    # Tasks run in this process share the model's candles, rather than reading them again.
+    _process_data.clear()
+    if workers == 1:
+        _process_data[_data_key(model)] = {"symbol_data": model.symbol_data}
+
+    tasks = []
+    task_indices = []
+    for indices in groups.values():
+        for symbol in model.symbol_data:
+            tasks.append((model.clone(), symbol, [combinations[i] for i in indices], vectorized))
+            task_indices.append(indices)
+
+    profits = [{} for _ in combinations]
+    orders = [defaultdict(list) for _ in combinations]
+    for indices, (symbol, results) in zip(task_indices, _map(_sweep_worker, tasks, workers)):
+        for index, (profit, symbol_orders) in zip(indices, results):
+            profits[index][symbol] = profit
+            orders[index][symbol] = symbol_orders
+
+    # Worker processes are sent a copy of the model without data, and read the candles themselves.
+    portfolio_model = model.clone()
+    values = _map(_portfolio_worker, [(order_list, portfolio_model, chunks) for order_list in orders], workers)
+    _process_data.clear()
+
+    rows = []
+    for combination, symbol_profits, value in zip(combinations, profits, values):
+        row = dict(combination)
+        row.update(symbol_profits)
+        row["profit"] = sum(symbol_profits.values())
+        row["portfolio_value"] = value["final_value"]
+        row.update(value["metrics"])
+        rows.append(row)
+
+    metric_names = list(values[0]["metrics"]) if values else []
+    results = pd.DataFrame(rows, columns=names + list(model.symbol_data) + ["profit", "portfolio_value"] + metric_names)
+    return results.sort_values("portfolio_value", ascending=False).reset_index(drop=True)
+
+
+def _map(function, tasks, workers):
+    """Apply a function to a list of argument tuples, in a process pool if there is more than one worker."""
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(function, *zip(*tasks))) if tasks else []
+    return [function(*task) for task in tasks]
+
+
+def _data_key(model):
+    """The settings that decide which candles a model reads."""
+    return (tuple(sorted(model.symbol_files.items())), model.start_time, model.end_time, model.columns,
+            model.interval, model.compact)
+
+
+def _process_symbol_data(model):
+    """Get the candles and ticks read so far in this process for a model's data, dropping those of other data.
+
+    Args:
+        model: A model with its data files found.
+
+    Returns:
+        A dictionary holding the symbol_data, which reads each symbol the first time it is used, and the
+        ticks once the portfolio simulation has collected them.
+    """
+    key = _data_key(model)
+    if key not in _process_data:
+        _process_data.clear()
+        _process_data[key] = {"symbol_data": LazySymbolData(model.symbol_files, model.read_symbol_data)}
+    return _process_data[key]
+
+
+def _sweep_worker(model, symbol, combinations, vectorized):
+    """Backtest a single symbol for a list of combinations that share the same indicators.
+
+    Args:
+        model: A copy of the model, which reads the symbol unless this process already has.
+        symbol: The symbol to test.
+        combinations: The parameter dictionaries to test.
+        vectorized: Whether to use the signals hook when a model provides it, rather than step().
+
+    Returns:
+        The symbol and the profit and orders for each combination.
+    """
+    value = _process_symbol_data(model)["symbol_data"][symbol]
+
+    model.set_parameters(combinations[0])
+    model.current_symbol = symbol
+    model.pre_backtest_calculations(value)
+
+    results = []
+    for combination in combinations:
+        model.set_parameters(combination)
+        model.orders = defaultdict(list)
+        model.simulate(symbol, value, vectorized)
+        results.append((model.balance - model.starting_balance, model.orders[symbol]))
+
+    return symbol, results
+
+
+def _portfolio_worker(order_list, model, chunks):
+    """Run the portfolio simulation for the orders of one combination.
+
+    Args:
+        order_list: The orders made by the combination, keyed on symbol.
+        model: A copy of the model the sweep was run on, which reads any symbols this process hasn't.
+        chunks: How many pieces to split the total assets into.
+
+    Returns:
+        A dictionary of the final value of the portfolio, and its metrics.
+    """
+    data = _process_symbol_data(model)
+    symbol_data = data["symbol_data"]
+    if "ticks" not in data:
+        ticks = set()
+        for value in symbol_data.values():
+            ticks.update(value["time"].values)
+        data["ticks"] = ticks
+    ticks = data["ticks"]
+
+    result = run_order_history(order_list, ticks, symbol_data, chunks=chunks, starting_balance=model.starting_balance)
+    return {"final_value": result.summary["final_value"], "metrics": metrics(result)}
@@ -0,0 +1,20 @@
+from benchmarks.synthetic import write_dataset
+from concurrent.futures import ProcessPoolExecutor
+from src.helpers.candle_cache import load_candles, read_candles
+
+import numpy as np
+
+
+def cached_shape(file_path):
+    return load_candles(file_path).shape
+
+
+def test_processes_build_the_same_cache_at_once(tmp_path):
+    write_dataset(str(tmp_path), symbols=1, bars=2000)
+    file_path = str(tmp_path / "SYM0000BTC_1h.json")
+
+    with ProcessPoolExecutor(max_workers=8) as executor:
+        shapes = list(executor.map(cached_shape, [file_path] * 16))
+
+    assert shapes == [read_candles(file_path).shape] * 16
+    assert np.array_equal(load_candles(file_path), read_candles(file_path))
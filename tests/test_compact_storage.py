@@ -0,0 +1,20 @@
+from benchmarks.synthetic import generate_candles
+from src.helpers.compact_storage import float32_indicator
+from src.helpers.indicator_cache import IndicatorCache
+
+from finta import TA
+import numpy as np
+import pandas as pd
+
+
+def test_float32_indicator_is_cached_apart_from_full_precision():
+    klines = np.array(generate_candles(200), dtype=np.float64)[:, :6]
+    value = pd.DataFrame(klines, columns=["time", "open", "high", "low", "close", "volume"])
+    cache = IndicatorCache()
+
+    full = cache.calculate(TA.RSI, value, "ETHBTC")
+    compact = cache.calculate(float32_indicator(TA.RSI), value, "ETHBTC")
+
+    assert full.dtype == np.float64
+    assert compact.dtype == np.float32
+    assert cache.calculate(TA.RSI, value, "ETHBTC").dtype == np.float64
@@ -0,0 +1,63 @@
+from benchmarks.synthetic import generate_candles
+from src.helpers.concurrent_fetch import RateLimiter, kline_weight
+from src.helpers.populate_data import populate_data
+
+import json
+import threading
+import time
+import pytest
+
+
+class StandInClient(object):
+    """Serves klines for a few symbols, recording when each request was made and its weight."""
+
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get_all_tickers(self):
+        return [{"symbol": symbol} for symbol in self.symbols]
+
+    def get_klines(self, symbol, interval, limit, startTime, endTime=None):
+        with self.lock:
+            self.requests.append((time.monotonic(), kline_weight(limit)))
+        return [kline for kline in self.symbols[symbol]
+                if kline[0] >= startTime and (endTime is None or kline[0] <= endTime)][:limit]
+
+
+@pytest.mark.parametrize("limit, weight", [(1, 1), (100, 1), (101, 2), (500, 2), (501, 5), (1000, 5), (1001, 10)])
+def test_kline_weight(limit, weight):
+    assert kline_weight(limit) == weight
+
+
+def test_rate_limiter_holds_requests_to_the_budget():
+    limiter = RateLimiter(weight_per_minute=620, burst=20)
+    start = time.monotonic()
+    for _ in range(15):
+        limiter.acquire(2)
+    # 20 of the 30 weight is the burst, and the other 10 arrive at 10 a second.
+    assert time.monotonic() - start >= 0.9
+
+
+def test_concurrent_download_is_throttled_and_kept_in_order(tmp_path):
+    symbols = {"SYM{}ETH".format(i): generate_candles(3000, seed=i) for i in range(3)}
+    client = StandInClient(symbols)
+    end = symbols["SYM0ETH"][-1][0]
+
+    populate_data(str(tmp_path), "ETH", "1h", symbols["SYM0ETH"][0][0], end, client=client, workers=4,
+                  weight_per_minute=620)
+
+    for symbol, klines in symbols.items():
+        with open(str(tmp_path / "{}_1h.json".format(symbol))) as f:
+            assert json.load(f) == klines
+
+    # However the requests were spread over the threads, they never used more than the burst plus the
+    # weight added since the first one, at 10 a second, give or take the time between taking and recording it.
+    requests = sorted(client.requests)
+    first = requests[0][0]
+    used = 0
+    for made, weight in requests:
+        used += weight
+        assert used <= 20 + (made - first) * 10 + 1
+    assert used == 3 * (1 + 6 * 2)
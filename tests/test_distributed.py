@@ -0,0 +1,71 @@
+from benchmarks.synthetic import write_dataset
+from models.rsi_adx.rsi_adx import RSI_ADX
+from src.distributed import run_distributed
+from src.helpers.job_queue import JobFailed, JobQueue
+
+import os
+import subprocess
+import sys
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def crash_once(marker, value):
+    """Kills the worker running it the first time, as a lost host would, and doubles the value after that."""
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return value * 2
+
+
+@pytest.fixture
+def workers(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    JobQueue(path)
+    # The workers need to import the jobs defined here, under the name pytest imported this module as.
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.path.dirname(os.path.abspath(__file__))]))
+    processes = [subprocess.Popen([sys.executable, "-m", "src.distributed", "worker", path, "--lease", "1",
+                                   "--poll", "0.1"], cwd=ROOT, env=environment, stdout=subprocess.DEVNULL)
+                 for _ in range(2)]
+    yield path
+    for process in processes:
+        process.kill()
+        process.wait()
+
+
+def test_distributed_backtest_matches_serial(tmp_path, workers):
+    write_dataset(str(tmp_path / "Test"), symbols=4, bars=1000)
+    model = RSI_ADX("Test", 1000, data_root=str(tmp_path) + "/", indicator_cache=None)
+    combinations = [{"rsi_low": 20}, {"rsi_low": 30}]
+
+    results = run_distributed(JobQueue(workers, lease=1), model, combinations, shard_size=3, poll=0.1, timeout=60)
+
+    for combination, result in zip(combinations, results):
+        serial = model.clone()
+        serial.set_parameters(combination)
+        assert list(result) == list(model.symbol_files)
+        for symbol, (orders, ticks, balance, profiler) in result.items():
+            serial.backtest_symbol(symbol, serial.read_symbol_data(symbol))
+            assert orders == serial.orders[symbol]
+            assert balance == serial.balance
+
+
+def test_job_of_killed_worker_is_retried(tmp_path, workers):
+    queue = JobQueue(workers, lease=1)
+    markers = [str(tmp_path / "crashed") if value == 2 else str(tmp_path / "never") for value in range(4)]
+    open(str(tmp_path / "never"), "w").close()
+
+    batch = queue.submit([(crash_once, (marker, value)) for value, marker in enumerate(markers)])
+
+    assert queue.wait(batch, poll=0.1, timeout=60) == [0, 2, 4, 6]
+
+
+def test_batch_fails_when_no_worker_is_left(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), lease=0.2)
+    batch = queue.submit([(crash_once, (str(tmp_path / "crashed"), 1))], max_attempts=1)
+    assert queue.claim("lost-worker") is not None
+
+    with pytest.raises(JobFailed):
+        queue.wait(batch, poll=0.1, timeout=10)
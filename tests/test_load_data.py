@@ -0,0 +1,40 @@
+from benchmarks.synthetic import generate_candles
+from models.rsi_adx.rsi_adx import RSI_ADX
+
+import json
+import pytest
+
+
+def write_candles(path, seed=0):
+    with open(str(path), "w") as f:
+        f.write(json.dumps(generate_candles(100, seed=seed)))
+
+
+def test_load_data_accepts_files_without_an_interval(tmp_path):
+    data_path = tmp_path / "Test"
+    data_path.mkdir()
+    write_candles(data_path / "ETHBTC.json")
+    write_candles(data_path / "LTCBTC_1h.json", seed=1)
+    write_candles(data_path / "XRPBTC_1h.json", seed=2)
+    write_candles(data_path / "XRPBTC_.json", seed=3)
+    (data_path / "notes.txt").write_text("not candles")
+
+    model = RSI_ADX("Test", 1000, data_root=str(tmp_path) + "/")
+    assert sorted(model.symbol_files) == ["ETHBTC", "LTCBTC", "XRPBTC"]
+    assert model.symbol_files["XRPBTC"].endswith("XRPBTC_.json")
+    assert model.symbol_intervals["ETHBTC"] is None
+
+    model = RSI_ADX("Test", 1000, data_root=str(tmp_path) + "/", whitelist=["ETHBTC"])
+    assert list(model.symbol_files) == ["ETHBTC"]
+    model = RSI_ADX("Test", 1000, data_root=str(tmp_path) + "/", exclusions=["ETHBTC"])
+    assert "ETHBTC" not in model.symbol_files
+
+    # Without an interval, the candles can't be lined up with those of another timeframe.
+    model.current_symbol = "XRPBTC"
+    value = model.symbol_data["XRPBTC"]
+    with pytest.raises(ValueError, match="no interval"):
+        model.align(model.timeframe("4h")["close"], "4h", value)
+
+    model = RSI_ADX("Test", 1000, data_root=str(tmp_path) + "/", whitelist=["LTCBTC", "XRPBTC"], interval="1h")
+    assert model.symbol_files["XRPBTC"].endswith("XRPBTC_1h.json")
+    assert model.symbol_intervals["LTCBTC"] == "1h"
@@ -0,0 +1,25 @@
+from src.helpers.metrics import equity_metrics, metrics
+from src.run_order_history import run_order_history
+
+import numpy as np
+import pandas as pd
+
+
+def test_equity_metrics_of_empty_curves():
+    assert all(np.isnan(value) for value in equity_metrics([]).values())
+    assert all(np.isnan(value).all() for value in equity_metrics(np.empty((3, 0))).values())
+
+
+def test_trade_returns_include_the_costs_of_the_run():
+    times = [0, 1]
+    data = {"ETHBTC": pd.DataFrame({"time": times, "close": [1.0, 1.0]})}
+    orders = {"ETHBTC": [
+        {"symbol": "ETHBTC", "type": "buy", "price": 1.0, "time": 0},
+        {"symbol": "ETHBTC", "type": "sell", "price": 1.0, "time": 1}
+    ]}
+
+    result = run_order_history(orders, times, data, chunks=1, slippage=0.01, fees=0.001)
+
+    statistics = metrics(result)
+    assert np.isclose(statistics["average_return"], result.summary["final_value"] / 1000 - 1)
+    assert statistics["average_return"] < 0
@@ -0,0 +1,30 @@
+from benchmarks.synthetic import write_dataset
+from models.bband_adx.bband_adx import BBAND_ADX
+from models.ema_rsi_adx.ema_rsi_adx import RSI_ADX as EMA_RSI_ADX
+from models.rsi_adx.rsi_adx import RSI_ADX
+
+import pytest
+
+
+def backtest_orders(model_class, data_root, parameters, vectorized):
+    model = model_class("Test", 1000, data_root=data_root, parameters=parameters, indicator_cache=None)
+    for symbol in model.symbol_data:
+        model.backtest_symbol(symbol, model.symbol_data[symbol], vectorized)
+    return dict(model.orders)
+
+
+@pytest.mark.parametrize("model_class, parameters", [
+    (RSI_ADX, {}),
+    (RSI_ADX, {"rsi_low": 60, "rsi_high": 40, "adx_threshold": 0}),
+    (EMA_RSI_ADX, {}),
+    (BBAND_ADX, {}),
+    # The buy and sell conditions overlap, so both hold on some candles and the buy takes precedence.
+    (BBAND_ADX, {"rsi_low": 70, "rsi_high": 30, "adx_threshold": 0})
+])
+def test_signals_match_step(tmp_path, model_class, parameters):
+    write_dataset(str(tmp_path / "Test"), symbols=3, bars=2000)
+    data_root = str(tmp_path) + "/"
+
+    vectorized = backtest_orders(model_class, data_root, parameters, True)
+    assert any(vectorized.values())
+    assert vectorized == backtest_orders(model_class, data_root, parameters, False)
@@ -0,0 +1,38 @@
+from benchmarks.synthetic import write_dataset
+from models.bband_adx.bband_adx import BBAND_ADX
+from models.rsi_adx.rsi_adx import RSI_ADX
+from src.sweep import run_sweep
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def data_root(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_dataset(str(tmp_path / "Test"), symbols=4, bars=1500)
+    return str(tmp_path) + "/"
+
+
+@pytest.mark.parametrize("model_class", [RSI_ADX, BBAND_ADX])
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_process_pool_matches_one_process(data_root, model_class, vectorized):
+    runs = []
+    for workers in (1, 3):
+        model = model_class("Test", 1000, data_root=data_root, indicator_cache=None)
+        result = model.run_backtest(vectorized=vectorized, workers=workers)
+        runs.append((model, result))
+
+    (serial, serial_result), (parallel, parallel_result) = runs
+    assert dict(parallel.orders) == dict(serial.orders)
+    assert list(parallel.balances.items()) == list(serial.balances.items())
+    assert parallel.all_ticks == serial.all_ticks
+    np.testing.assert_array_equal(parallel_result.value_points, serial_result.value_points)
+
+
+def test_sweep_in_processes_matches_one_process(data_root):
+    grid = {"rsi_low": [20, 30], "rsi_high": [70, 80]}
+    serial = run_sweep(RSI_ADX, grid, "Test", 1000, data_root=data_root)
+    parallel = run_sweep(RSI_ADX, grid, "Test", 1000, workers=3, data_root=data_root)
+    pd.testing.assert_frame_equal(parallel, serial)
@@ -0,0 +1,86 @@
+from benchmarks.synthetic import generate_candles, write_dataset
+from models.rsi_adx.rsi_adx import RSI_ADX
+from src.helpers.candle_cache import CACHE_DIRECTORY
+from src.helpers.populate_data import get_symbol_history, part_path, stream_symbol_history
+
+import json
+import os
+import pytest
+
+
+class PagedClient(object):
+    """Serves klines a page at a time, failing after a set number of pages to stand in for a dropped connection."""
+
+    def __init__(self, klines, pages=None):
+        self.klines = klines
+        self.pages = pages
+
+    def get_klines(self, symbol, interval, limit, startTime, endTime=None):
+        if self.pages is not None:
+            if self.pages == 0:
+                raise ConnectionError("connection dropped")
+            self.pages -= 1
+        return [kline for kline in self.klines if kline[0] >= startTime][:limit]
+
+
+def test_interrupted_download_resumes_outside_data_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data_path = str(tmp_path / "Test")
+    write_dataset(data_path, symbols=2, bars=300)
+    klines = generate_candles(1200, seed=5)
+    file_path = "{}/NEWBTC_1h.json".format(data_path)
+
+    with pytest.raises(ConnectionError):
+        stream_symbol_history(file_path, "NEWBTC", "1h", klines[0][0], client=PagedClient(klines, pages=1))
+    assert os.path.exists(part_path(file_path))
+    assert not os.path.exists(file_path)
+
+    # The leftover partial download isn't picked up as data.
+    model = RSI_ADX("Test", 1000, data_root=str(tmp_path) + "/")
+    assert sorted(model.symbol_files) == ["SYM0000BTC", "SYM0001BTC"]
+    model.run_backtest()
+
+    stream_symbol_history(file_path, "NEWBTC", "1h", klines[0][0], client=PagedClient(klines))
+    assert not os.path.exists(part_path(file_path))
+    with open(file_path) as f:
+        assert json.load(f) == klines
+
+
+def test_interrupted_update_keeps_the_stored_history(tmp_path):
+    klines = generate_candles(1500, seed=7)
+    file_path = str(tmp_path / "NEWBTC_1h.json")
+    with open(file_path, "w") as f:
+        f.write(json.dumps(klines[:400]))
+
+    with pytest.raises(ConnectionError):
+        get_symbol_history(str(tmp_path), "NEWBTC", "1h", end=None, update=True, client=PagedClient(klines, pages=2))
+    with open(file_path) as f:
+        assert json.load(f) == klines[:400]
+
+    get_symbol_history(str(tmp_path), "NEWBTC", "1h", end=None, update=True, client=PagedClient(klines))
+    with open(file_path) as f:
+        assert json.load(f) == klines
+    assert not os.listdir(str(tmp_path / CACHE_DIRECTORY))
+
+
+@pytest.mark.parametrize("pages", [0, 1, 2, 3])
+def test_resumed_download_has_every_candle_once(tmp_path, pages):
+    klines = generate_candles(1800, seed=9)
+    file_path = str(tmp_path / "NEWBTC_1h.json")
+
+    with pytest.raises(ConnectionError):
+        stream_symbol_history(file_path, "NEWBTC", "1h", klines[0][0], client=PagedClient(klines, pages=pages))
+    # The process died part way through writing a line.
+    with open(part_path(file_path), "a") as f:
+        f.write(json.dumps(klines[pages * 500])[:20])
+
+    # Every later run is interrupted after one more page, until the download finishes.
+    while True:
+        try:
+            stream_symbol_history(file_path, "NEWBTC", "1h", klines[0][0], client=PagedClient(klines, pages=1))
+            break
+        except ConnectionError:
+            assert not os.path.exists(file_path)
+
+    with open(file_path) as f:
+        assert json.load(f) == klines
@@ -0,0 +1,17 @@
+from benchmarks.synthetic import write_dataset
+from models.rsi_adx.rsi_adx import RSI_ADX
+from src.helpers.price_panel import build_panel
+
+import pandas as pd
+
+
+def test_panel_frames_match_the_data_files(tmp_path):
+    write_dataset(str(tmp_path / "Test"), symbols=3, bars=500, stagger=100)
+    model = RSI_ADX("Test", 1000, data_root=str(tmp_path) + "/")
+
+    panel = build_panel(model, str(tmp_path / "panel"))
+
+    assert list(panel.symbols) == list(model.symbol_files)
+    assert len(panel.times) == 700
+    for symbol in model.symbol_files:
+        pd.testing.assert_frame_equal(panel.frame(symbol), model.read_symbol_data(symbol))
@@ -0,0 +1,29 @@
+from src.helpers.profiling import Profiler
+
+import tracemalloc
+
+
+def test_profiler_stops_the_tracing_it_started():
+    with Profiler(track_memory=True) as profiler:
+        with profiler.phase("load_data", "ETHBTC"):
+            data = [0] * 100000
+        assert tracemalloc.is_tracing()
+    assert not tracemalloc.is_tracing()
+    assert profiler.records[("load_data", "ETHBTC")][2] >= len(data) * 8
+
+    profiler = Profiler(track_memory=True)
+    with profiler.phase("load_data"):
+        pass
+    profiler.report()
+    assert not tracemalloc.is_tracing()
+
+
+def test_profiler_leaves_tracing_started_elsewhere():
+    tracemalloc.start()
+    try:
+        with Profiler(track_memory=True) as profiler:
+            with profiler.phase("load_data"):
+                pass
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
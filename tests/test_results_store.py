@@ -0,0 +1,32 @@
+from benchmarks.synthetic import write_dataset
+from concurrent.futures import ProcessPoolExecutor
+from models.rsi_adx.rsi_adx import RSI_ADX
+from src.helpers.results_store import ResultsStore
+
+import os
+
+
+def save_run(data_root, directory, rsi_low):
+    model = RSI_ADX("Test", 1000, data_root=data_root, parameters={"rsi_low": rsi_low})
+    model.run_backtest()
+    store = ResultsStore(directory)
+    key = store.run_key(model)
+    store.save(key, model, model.balances)
+    return key
+
+
+def test_runs_saved_at_once_are_all_kept(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_dataset(str(tmp_path / "Test"), symbols=2, bars=300)
+    data_root = str(tmp_path) + "/"
+    directory = str(tmp_path / "Results")
+    save_run(data_root, directory, 20)
+
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        keys = list(executor.map(save_run, [data_root] * 8, [directory] * 8, range(10, 26, 2)))
+
+    store = ResultsStore(directory)
+    assert sorted(store.read_index()) == sorted(set(keys))
+    assert sorted(store.runs()["rsi_low"]) == list(range(10, 26, 2))
+    assert not [name for name in os.listdir(directory) if name.endswith(".tmp")]
+    assert store.load(keys[0]).metadata["libraries"]["numpy"] is not None
@@ -0,0 +1,28 @@
+from benchmarks.synthetic import write_dataset
+from collections import OrderedDict
+from models.bband_adx.bband_adx import BBAND_ADX
+from models.rsi_adx.rsi_adx import RSI_ADX
+from src.run_models import run_models
+
+import threading
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+
+def test_charts_are_drawn_on_the_main_thread(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_dataset(str(tmp_path / "Test"), symbols=2, bars=500)
+    threads = []
+    savefig = plt.savefig
+
+    def recorded_savefig(*args, **kwargs):
+        threads.append(threading.current_thread())
+        return savefig(*args, **kwargs)
+
+    monkeypatch.setattr(plt, "savefig", recorded_savefig)
+    models = OrderedDict([("rsi_adx.RSI_ADX", RSI_ADX), ("bband_adx.BBAND_ADX", BBAND_ADX)])
+    table = run_models(models, "Test", 1000, workers=2, data_root=str(tmp_path) + "/")
+
+    assert list(table.index) == list(models)
+    assert threads == [threading.main_thread()] * 2
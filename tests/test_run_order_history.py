@@ -0,0 +1,21 @@
+from src.run_order_history import run_order_scenarios
+
+import pandas as pd
+
+
+def test_scenario_skips_buy_of_held_symbol():
+    # The sell between the two buys was dropped, so the second buy finds the symbol still held.
+    times = [0, 1, 2, 3]
+    data = {"ETHBTC": pd.DataFrame({"time": times, "close": [1.0, 2.0, 4.0, 4.0]})}
+    orders = {"ETHBTC": [
+        {"symbol": "ETHBTC", "type": "buy", "price": 1.0, "time": 0},
+        {"symbol": "ETHBTC", "type": "buy", "price": 4.0, "time": 2},
+        {"symbol": "ETHBTC", "type": "sell", "price": 4.0, "time": 3}
+    ]}
+
+    scenarios = run_order_scenarios(orders, times, data, fees=0.0, slippage=0.0, chunks=2)
+
+    # Half of the balance buys 500 tokens at 1, which are all sold at 4.
+    assert scenarios["final_value"][0] == 2500
+    assert scenarios["trades"][0] == 2
+    assert scenarios["skipped_orders"][0] == 1
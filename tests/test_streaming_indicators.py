@@ -0,0 +1,40 @@
+from benchmarks.synthetic import generate_candles
+from src.helpers import streaming_indicators
+
+from finta import TA
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture(scope="module")
+def candles():
+    klines = np.array(generate_candles(3000, seed=3), dtype=np.float64)[:, :6]
+    return pd.DataFrame(klines, columns=["time", "open", "high", "low", "close", "volume"])
+
+
+def stream(indicator, candles):
+    return np.array([indicator.update(bar) for bar in candles.to_dict("records")], dtype=np.float64)
+
+
+@pytest.mark.parametrize("name, function, params", [
+    ("EMA", TA.EMA, {}),
+    ("EMA", TA.EMA, {"period": 20}),
+    ("RSI", TA.RSI, {}),
+    ("RSI", TA.RSI, {"period": 7}),
+    ("ATR", TA.ATR, {}),
+    ("ADX", TA.ADX, {}),
+    ("ADX", TA.ADX, {"period": 7})
+])
+def test_matches_finta(candles, name, function, params):
+    expected = function(candles, **params).values
+    actual = stream(getattr(streaming_indicators, name)(**params), candles)
+    np.testing.assert_allclose(actual, expected, rtol=1e-10, atol=1e-10)
+
+
+@pytest.mark.parametrize("period", [20, 10])
+def test_bbands_match_finta(candles, period):
+    expected = TA.BBANDS(candles, period=period)
+    for band in ("BB_UPPER", "BB_MIDDLE", "BB_LOWER"):
+        actual = stream(streaming_indicators.BBANDS(period, band=band), candles)
+        np.testing.assert_allclose(actual, expected[band].values, rtol=1e-10, atol=1e-10)
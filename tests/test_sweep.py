@@ -0,0 +1,24 @@
+from benchmarks.synthetic import write_dataset
+from collections import Counter
+from models.rsi_adx.rsi_adx import RSI_ADX
+from src.base.alphaprototype import AlphaPrototype
+from src.sweep import run_sweep
+
+
+def test_sweep_reads_each_symbol_once(tmp_path, monkeypatch):
+    write_dataset(str(tmp_path / "Test"), symbols=3, bars=500)
+    reads = Counter()
+    read_symbol = AlphaPrototype.read_symbol
+
+    def counted_read_symbol(self, file_path, interval=None):
+        reads[file_path] += 1
+        return read_symbol(self, file_path, interval)
+
+    monkeypatch.setattr(AlphaPrototype, "read_symbol", counted_read_symbol)
+    monkeypatch.setattr(RSI_ADX, "indicator_parameter_names", ("adx_threshold",))
+    results = run_sweep(RSI_ADX, {"adx_threshold": [20, 25], "rsi_low": [20, 30]}, "Test", 1000,
+                        data_root=str(tmp_path) + "/")
+
+    assert len(results) == 4
+    assert len(reads) == 3
+    assert set(reads.values()) == {1}